@@ -1,6 +1,9 @@
 import sql_manager
 import triple_manager
 import object_manager
+import object_manager.models
+from triple_manager import write_behind
+from triple_manager import property_tables
 
 """
 initialize the environment
@@ -8,13 +11,20 @@ calls initialize in each package
 initializes any required state
 """
 
-def initialize(connect_string):
+def initialize(connect_string, echo=False, term_dictionary=False):
     """
     Initializes the rdf Mapper system, most importantly the SQL session
     connect_string - SQLAlchemy engine configuration string     
+    echo - SQLAlchemy statement logging(False, True or 'debug')
+    term_dictionary - use the dictionary encoded storage layout(integer term
+    ids instead of URI strings in the triple tables)
     """
     print("Initializing RDF Mapper Environment")
-    session = sql_manager.initialize(connect_string)
+    # when switching stores, the pending writes go to the previous one
+    # and the property tables of the previous one are forgotten
+    write_behind.disable()
+    property_tables.property_tables.clear()
+    session = sql_manager.initialize(connect_string, echo, term_dictionary)
     # set session on super class to newly instantiated db session
     # now all RDFSubject sub classes have easy access to session
     object_manager.models.RDFSubject._session = session
@@ -0,0 +1,4 @@
+"""
+Benchmark harness for the RDF Mapper(see harness.py).
+Run with: python -m rdf_mapper.benchmark.harness --help
+"""
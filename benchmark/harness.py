@@ -0,0 +1,254 @@
+import json
+import multiprocessing
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from optparse import OptionParser
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+from .. import initialize
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..sql_manager import instrumentation
+
+"""
+Reproducible benchmarks of the object layer. A synthetic graph of
+people owning dogs is generated(configurable size, fan out and list
+valued predicates) and save, find, find with where, find_by_uri, lazy
+loading and delete are timed against each store. Every store runs in its
+own process, so the peak memory reported is the store's own and the
+SQLAlchemy mappers are set up once per run. Results can be saved as a
+baseline and later runs compared against it to hold releases to
+performance budgets.
+"""
+
+# connect strings of the stores, {0} is a scratch directory
+STORES = {'memory' : "sqlite://", 'file' : "sqlite:///{0}/benchmark.db"}
+
+# options that change what is measured, a baseline is only
+# compared against a run made with the same values
+BASELINE_OPTIONS = ('size', 'fan_out', 'list_size', 'lookups', 'seed', 'term_dictionary')
+
+# the benchmark models, the same shape as the sample app
+
+class Person(models.RDFSubject):
+    email = define_uri()
+    age = define_predicate()
+    name = define_predicate()
+    owns = define_predicate()
+
+class Dog(models.RDFSubject):
+    uri = define_uri(auto=True)
+    nick_names = define_predicate()
+
+def generate_graph(size, fan_out, list_size, seed):
+    """
+    Generates the synthetic graph as records. Returns a list of
+    (person predicate values, list of dog nick names lists) tuples.
+    size - number of people
+    fan_out - number of dogs each person owns
+    list_size - number of entries of the list valued nick_names predicate
+    seed - random seed, the same seed generates the same graph
+    """
+    rand = random.Random(seed)
+    graph = []
+    for i in range(size):
+        person = {'email' : "person{0}@example.com".format(i), 'age' : rand.randint(18, 90), 'name' : "name{0}".format(rand.randint(0, size))}
+        dogs = [["nick{0}".format(rand.randint(0, 1000)) for n in range(list_size)] for d in range(fan_out)]
+        graph.append((person, dogs))
+    return graph
+
+def timed(results, name, operations, function):
+    """
+    Runs a benchmark step and records its time, throughput and query count
+    results - dict the step's measurements are added to
+    name - the name of the step
+    operations - the number of operations the step performs
+    function - the step
+    """
+    queries = instrumentation.get_stats()['queries']
+    start = time.time()
+    value = function()
+    elapsed = time.time() - start
+    results[name] = {'operations' : operations,
+                     'seconds' : elapsed,
+                     'ops_per_second' : operations / elapsed if elapsed > 0 else 0.0,
+                     'queries' : instrumentation.get_stats()['queries'] - queries}
+    return value
+
+def run_store(connect_string, options):
+    """
+    Runs every benchmark step against one store. Returns the measurements.
+    connect_string - SQLAlchemy engine configuration string of the store
+    options - the parsed command line options
+    """
+    initialize(connect_string, term_dictionary=options.term_dictionary)
+    graph = generate_graph(options.size, options.fan_out, options.list_size, options.seed)
+    rand = random.Random(options.seed)
+    results = {}
+    dog_count = options.size * options.fan_out
+    def save_dogs():
+        owned = []
+        for person, dogs in graph:
+            person_dogs = []
+            for nick_names in dogs:
+                dog = Dog(nick_names=nick_names)
+                dog.save()
+                person_dogs.append(dog)
+            owned.append(person_dogs)
+        return owned
+    owned = timed(results, 'save_dogs', dog_count, save_dogs)
+    def save_people():
+        for (person, dogs), person_dogs in zip(graph, owned):
+            Person(owns=person_dogs, **person).save()
+    timed(results, 'save_people', options.size, save_people)
+    people = timed(results, 'find_all', options.size, lambda: Person.find())
+    names = [rand.choice(graph)[0]['name'] for i in range(options.lookups)]
+    timed(results, 'find_where', len(names), lambda: [Person.find(where={'name' : name}) for name in names])
+    dog_uris = [rand.choice(owned[rand.randrange(len(owned))]).uri for i in range(options.lookups)] if dog_count else []
+    timed(results, 'find_by_uri', len(dog_uris), lambda: [Dog.find_by_uri(uri) for uri in dog_uris])
+    def lazy_load():
+        for person in people:
+            person.owns
+    timed(results, 'lazy_load', dog_count, lazy_load)
+    def delete():
+        # people first, dogs cannot be deleted while referenced
+        for person in people:
+            person.delete()
+        for person_dogs in owned:
+            for dog in person_dogs:
+                dog.delete()
+    timed(results, 'delete', options.size + dog_count, delete)
+    # ru_maxrss is in kilobytes on linux, bytes on os x
+    results['peak_memory'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+def store_process(connect_string, options, queue):
+    """
+    Entry point of the per store process. Puts (measurements, None)
+    on the queue, or (None, traceback) when the run fails.
+    """
+    try:
+        queue.put((run_store(connect_string, options), None))
+    except Exception:
+        queue.put((None, traceback.format_exc()))
+
+def store_outcome(process, queue):
+    """
+    Waits for the outcome of a store process, without hanging
+    when the process dies before putting it on the queue
+    """
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            if not process.is_alive():
+                break
+    try:
+        # put just before the process exited
+        return queue.get(timeout=1)
+    except Empty:
+        return (None, "the process exited with code {0}".format(process.exitcode))
+
+def run(options):
+    """
+    Runs the benchmarks against the selected stores, each in its own process.
+    Returns {store name : measurements}, raises RuntimeError when a store fails.
+    options - the parsed command line options
+    """
+    results = {}
+    scratch = tempfile.mkdtemp(prefix='rdf_mapper_benchmark')
+    try:
+        for store in options.stores.split(','):
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=store_process, args=(STORES[store].format(scratch), options, queue))
+            process.start()
+            measurements, error = store_outcome(process, queue)
+            process.join()
+            if error is not None:
+                raise RuntimeError("{0} store failed:\n{1}".format(store, error))
+            results[store] = measurements
+    finally:
+        shutil.rmtree(scratch)
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the measurements against a baseline. Returns a list of
+    regression descriptions(empty when within budget).
+    results - the measurements of this run
+    baseline - the measurements of the baseline run
+    tolerance - allowed slowdown, 0.2 means 20% slower
+    """
+    regressions = []
+    for store, steps in sorted(results.items()):
+        for step, measurement in sorted(steps.items()):
+            base = baseline.get(store, {}).get(step)
+            if base is None or step == 'peak_memory':
+                continue
+            if measurement['queries'] > base['queries']:
+                regressions.append("{0}.{1}: {2} queries, baseline {3}".format(store, step, measurement['queries'], base['queries']))
+            if base['seconds'] > 0 and measurement['seconds'] > base['seconds'] * (1 + tolerance):
+                regressions.append("{0}.{1}: {2:.3f}s, baseline {3:.3f}s".format(store, step, measurement['seconds'], base['seconds']))
+    return regressions
+
+def report(results):
+    """
+    Prints the measurements as a table
+    """
+    for store, steps in sorted(results.items()):
+        print("{0} store, peak memory {1}".format(store, steps['peak_memory']))
+        for step, measurement in sorted(steps.items()):
+            if step == 'peak_memory':
+                continue
+            print("  {0:<12} {1:>8} ops {2:>9.3f}s {3:>10.1f} ops/s {4:>8} queries".format(step, measurement['operations'], measurement['seconds'], measurement['ops_per_second'], measurement['queries']))
+
+def main(argv=None):
+    parser = OptionParser(usage="python -m rdf_mapper.benchmark.harness [options]")
+    parser.add_option('--size', type='int', default=200, help="number of people generated")
+    parser.add_option('--fan-out', dest='fan_out', type='int', default=2, help="number of dogs each person owns")
+    parser.add_option('--list-size', dest='list_size', type='int', default=3, help="number of nick names of each dog")
+    parser.add_option('--lookups', type='int', default=50, help="number of find_where/find_by_uri lookups")
+    parser.add_option('--seed', type='int', default=0, help="random seed of the generated graph")
+    parser.add_option('--stores', default='memory,file', help="comma separated stores to run: memory, file")
+    parser.add_option('--term-dictionary', dest='term_dictionary', action='store_true', default=False, help="use the dictionary encoded storage layout")
+    parser.add_option('--save-baseline', dest='save_baseline', help="write the results to this file")
+    parser.add_option('--compare', help="compare the results against this baseline file")
+    parser.add_option('--tolerance', type='float', default=0.2, help="allowed slowdown against the baseline")
+    options, args = parser.parse_args(argv)
+    if options.size < 1:
+        parser.error("--size must be at least 1")
+    run_options = dict([(name, getattr(options, name)) for name in BASELINE_OPTIONS])
+    baseline = None
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('options') != run_options:
+            # measurements of a different graph or layout are not comparable
+            print("Baseline options {0} differ from this run's {1}, not comparing".format(baseline.get('options'), run_options))
+            return 2
+    try:
+        results = run(options)
+    except RuntimeError as e:
+        print(str(e))
+        return 2
+    report(results)
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as baseline_file:
+            json.dump({'options' : run_options, 'results' : results}, baseline_file, indent=2, sort_keys=True)
+    if baseline is not None:
+        regressions = compare(results, baseline['results'], options.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -65,5 +65,26 @@ class RDFObjectPersistanceException(RDFException):
     
     def __init__(self,error_val):
         self.error_cause = self.ERRORS.get(error_val)
-        
-    
\ No newline at end of file
+
+class RDFImportException(RDFException):
+    """
+    Exception raised when a bulk import file cannot be parsed
+    """
+    ERRORS = {1:"Cannot parse N-Triples line "}
+    
+    def __init__(self,error_val,line_number,line):
+        self.error_cause = "{0}{1}: {2}".format(self.ERRORS.get(error_val),line_number,line.strip())
+
+class RDFWriteBehindException(RDFException):
+    """
+    Exception raised when write behind cannot be used, or to the thread
+    that queued writes which failed to be written
+    """
+    ERRORS = {1:"Queued writes failed: ", 2:"Write behind needs a db shared between connections(not in memory sqlite)"}
+    
+    def __init__(self,error_val,causes=()):
+        self.error_cause = self.ERRORS.get(error_val)
+        # the exceptions of the failed writes
+        self.causes = list(causes)
+        if self.causes:
+            self.error_cause = self.error_cause + "; ".join([str(cause) for cause in self.causes])
@@ -0,0 +1,147 @@
+import multiprocessing
+from collections import deque
+from sqlalchemy import create_engine
+from model_helpers import classify_uri
+from exceptions import RDFNoUriException
+from ..sql_manager.lib import create_session, reserve_ids
+from ..triple_manager.lib import insert_triples
+
+"""
+Parallel bulk loader. The input stream is cut into chunks and
+each chunk is converted to triples(RDFSubject.build_triples) by a
+worker process. Auto URIs are reserved up front, per chunk, from the
+sequence used by get_id, so every worker gets a disjoint id range.
+The triples are then written with bulk inserts, either by the workers
+themselves(each on its own connection) or, for sqlite, serialized
+through the calling process.
+"""
+
+# db session of a worker process, set up by init_worker
+worker_session = None
+
+def init_worker(connect_string):
+    """
+    Initializes a worker process. When a connect string is given,
+    the worker opens its own connection and writes its own triples.
+    connect_string - SQLAlchemy engine configuration string(or None)
+    """
+    global worker_session
+    if connect_string:
+        worker_session = create_session(create_engine(connect_string))
+
+def convert_chunk(chunk):
+    """
+    Converts a chunk of the input into triples. Runs in a worker process.
+    Returns (triples, triples_with_datatype) when the calling process does
+    the writing, otherwise writes them and returns the number of triples written.
+    chunk - list of (object or record dict, model class, reserved auto uri or None)
+    """
+    triples = []
+    triples_with_datatype = []
+    for item,model,raw_uri in chunk:
+        if isinstance(item, dict):
+            obj = model(**item)
+        else:
+            obj = item
+        auto_uri_field_name = obj.auto_uri_field_name()
+        if auto_uri_field_name:
+            obj.__dict__[auto_uri_field_name] = raw_uri
+        raw_uri = obj.get_uri()
+        if raw_uri is None or isinstance(raw_uri, list) or isinstance(raw_uri, tuple):
+            raise RDFNoUriException(obj)
+        obj_triples,obj_triples_with_datatype = obj.build_triples(classify_uri(obj.__class__,raw_uri))
+        triples.extend(obj_triples)
+        # values are stored as strings, same as save_triples does
+        triples_with_datatype.extend([(t[0],t[1],t[2],str(t[3])) for t in obj_triples_with_datatype])
+    if worker_session is not None:
+        insert_triples(triples, triples_with_datatype, worker_session)
+        return len(triples) + len(triples_with_datatype)
+    return (triples,triples_with_datatype)
+
+def chunk_items(items, chunk_size):
+    """
+    Lazily cuts the input stream into lists of chunk_size items
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def bulk_load(items, session, model=None, processes=None, chunk_size=1000, connect_string=None):
+    """
+    Loads a stream of RDFSubject instances(or record dicts) into
+    the triple store using a pool of worker processes. Objects referenced
+    by the loaded objects must already be saved. Returns the number of
+    objects loaded. Loaded instances get their auto URI assigned
+    and are marked as persisted.
+
+    items - iterable of RDFSubject instances, or dicts of predicate values
+    when model is given
+    session - the SQLAlchemy db session
+    model - the RDFSubject class records are instances of(only for dict records)
+    processes - number of worker processes(defaults to the number of cpus)
+    chunk_size - the number of objects converted per task/ inserted per statement
+    connect_string - SQLAlchemy engine configuration string the workers use to
+    write their own triples in parallel. Ignored for sqlite, where workers
+    only convert and the calling process serializes the writes.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if connect_string and 'sqlite' in connect_string:
+        connect_string = None
+    pool = multiprocessing.Pool(processes, init_worker, (connect_string,))
+    # tasks in flight, (async result, loaded objects, chunk size)
+    pending = deque()
+    loaded = [0]
+    def merge(task):
+        result,objects,size = task
+        result = result.get()
+        if connect_string is None:
+            # serialize the write through this process
+            insert_triples(result[0], result[1], session)
+        # only now are the objects in the db
+        for obj in objects:
+            obj._persisted = True
+        loaded[0] += size
+    try:
+        for chunk in chunk_items(items, chunk_size):
+            auto_items = []
+            for item in chunk:
+                if isinstance(item, dict):
+                    item_model = model
+                    auto = item_model.__dict__[item_model.uri_pred()].auto_uri
+                else:
+                    item_model = item.__class__
+                    auto = item.auto_uri_field_name() is not None
+                auto_items.append((item,item_model,auto))
+            # reserve the auto uris of this chunk in one go
+            auto_count = len([a for a in auto_items if a[2]])
+            ids = iter([])
+            if auto_count:
+                ids = iter(reserve_ids(session, auto_count))
+                session.commit()
+            job = []
+            objects = []
+            for item,item_model,auto in auto_items:
+                raw_uri = None
+                if auto:
+                    raw_uri = next(ids)
+                if not isinstance(item, dict):
+                    if auto:
+                        item.__dict__[item.auto_uri_field_name()] = raw_uri
+                    objects.append(item)
+                job.append((item,item_model,raw_uri))
+            pending.append((pool.apply_async(convert_chunk, (job,)),objects,len(job)))
+            # keep the pool busy without reading the whole stream into memory
+            if len(pending) >= processes * 2:
+                merge(pending.popleft())
+        while pending:
+            merge(pending.popleft())
+    finally:
+        pool.terminate()
+        pool.join()
+    return loaded[0]
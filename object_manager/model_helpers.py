@@ -1,6 +1,13 @@
 from ..sql_manager.lib import get_id
+from ..sql_manager.instrumentation import instrumented, increment
+from ..sql_manager import terms
+from ..sql_manager import search
+from ..triple_manager import encoded
+from ..triple_manager import write_behind
+from ..triple_manager.property_tables import delete_properties
 from ..sql_manager.models import Triple,TripleWithDatatype
-from exceptions import RDFNoUriException
+from ..triple_manager.lib import convert_value
+from exceptions import RDFNoUriException, RDFObjectPersistanceException
 
 """
 Collection of helper methods used in
@@ -51,6 +58,19 @@ class RDFObjectHelper(object):
         
     def get_object_type(self,rdfsubject_class):
         return get_class_type(self.class_name,rdfsubject_class)
+
+@instrumented('lazy_load')
+def lazy_load(object_helper,rdfsubject_class):
+    """
+    Loads the RDFSubject instance an RDFObjectHelper stands in for
+    object_helper - the RDFObjectHelper place holder
+    rdfsubject_class - the RDFSubject class constant
+    """
+    obj_class_type = object_helper.get_object_type(rdfsubject_class)
+    if obj_class_type:
+        return obj_class_type.find_by_uri(object_helper.full_uri,True)
+    else:
+        raise RDFObjectPersistanceException(2)
         
 def fetch_uri(obj,session):
     """
@@ -114,6 +134,12 @@ def is_object(uri, session):
     session - the SQLAlchemy db session
     """
     referenced = False
+    # queued saves may add references
+    write_behind.flush()
+    if terms.enabled():
+        referenced = encoded.is_object(uri, session)
+        session.commit()
+        return referenced
     # check the db to see if the uri exists anywhere
     count = session.query(Triple).filter(Triple.object_uri == uri).count()
     session.commit()
@@ -121,12 +147,20 @@ def is_object(uri, session):
         referenced = True
     return referenced
     
+@instrumented('delete_obj')
 def delete_obj(uri,session):
     """
     Deletes an RDFSubject instnace from the db
     uri - The uri of the object to delete
     session - the SQLAlchemy db session
     """
+    # queued saves of the object must not bring it back
+    write_behind.flush()
+    # committed along with the deletion of the triples
+    delete_properties(uri,session)
+    search.unindex_subject(session,uri)
+    if terms.enabled():
+        return encoded.delete_triples(uri,session)
     session.query(Triple).filter(Triple.subject_uri == uri).delete()
     session.query(TripleWithDatatype).filter(TripleWithDatatype.subject_uri == uri).delete()
     session.commit()
@@ -142,6 +176,7 @@ def parse_objects_into_buckets(triples,triples_with_datatype):
     """
     # throw them together for easy parsing
     all_triples = set(triples) ^ set(triples_with_datatype) 
+    increment('triples_decoded', len(all_triples))
     object_buckets = {}
     for triple in all_triples:
         sub_uri = triple.subject_uri
@@ -150,8 +185,7 @@ def parse_objects_into_buckets(triples,triples_with_datatype):
             obj_uri = triple.object_uri
             obj_val = RDFObjectHelper(obj_uri)
         else:
-            obj_type = eval(triple.object_type)
-            obj_val = obj_type(triple.object_value)
+            obj_val = convert_value(triple.object_type,triple.object_value)
         # parse each triple and pass it to a bucket
         object_buckets = parse_object_triple(object_buckets,sub_uri,pred_uri,obj_val)
     return object_buckets
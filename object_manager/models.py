@@ -1,6 +1,8 @@
-from model_helpers import fetch_uri, classify_uri, get_object_uri,is_object,delete_obj, parse_objects_into_buckets, RDFObjectHelper, declassify_uri
+from model_helpers import fetch_uri, classify_uri, get_object_uri,is_object,delete_obj, parse_objects_into_buckets, RDFObjectHelper, declassify_uri, lazy_load
 from exceptions import RDFNoUriException, RDFObjectNoUriException, RDFDeletionException, RDFObjectPersistanceException
-from ..triple_manager.lib import save_triples,find_triples
+from ..triple_manager.lib import save_triples,find_triples,find_columns
+from ..triple_manager.property_tables import get_property_table, save_properties, find_property_triples
+from ..sql_manager.instrumentation import instrumented
 
 """
 The collection of classes and helper methods that
@@ -8,6 +10,11 @@ serve as the object interface to the RDF Mapper system.
 All objects intended to be represented as RDF triples
 extend classes in this module.
 """
+# storage modes a class can declare with its storage attribute
+TRIPLES = 'triples'
+# single valued literal predicates in one wide row per object
+PROPERTY_TABLE = 'property_table'
+
 # Helpers
 
 def define_predicate():
@@ -44,6 +51,12 @@ class RDFSubjectMeta(type):
     def __new__(meta, classname, supers, classdict):
         pred_names = [key for key in classdict if isinstance(classdict[key],RDFPredicate)]
         classdict['predicates'] = pred_names
+        # predicates that get a column in the class's property table
+        # (the auto uri is the subject, it is not stored as a predicate)
+        property_pred_names = []
+        if classdict.get('storage') == PROPERTY_TABLE:
+            property_pred_names = [key for key in pred_names if not classdict[key].auto_uri]
+        classdict['property_predicates'] = property_pred_names
         return type.__new__(meta, classname, supers, classdict)
 
 class RDFSubject(object):
@@ -52,11 +65,15 @@ class RDFSubject(object):
     RDF Mapper system must extend to be a part of the application's
     RDF graph. Extension of this class is the mechanism that enables all
     RDF Mapper functionality for a class(CRUD,searching,etc).
+    Subclasses can set storage = PROPERTY_TABLE to store their single
+    valued literal predicates in a table of their own.
     """
 
     __metaclass__ = RDFSubjectMeta 
+    storage = TRIPLES
     
     @classmethod
+    @instrumented('find')
     def find(cls,**kwargs):
         """
         Class level method that allows criteria based searching
@@ -70,7 +87,9 @@ class RDFSubject(object):
         where_clause = kwargs.get('where')
         cls_name = cls.__name__.lower()
         # tells the triple manager layer to do all the searching
-        if where_clause:
+        if cls.property_predicates:
+            object_triples_tuple = find_property_triples(cls_name,cls.property_table(),session,where_clause)
+        elif where_clause:
             object_triples_tuple = find_triples(cls_name,session,where_clause)
         else:    
             object_triples_tuple = find_triples(cls_name,session)
@@ -109,6 +128,35 @@ class RDFSubject(object):
                 set_persisted(objects)
         return objects
     
+    @classmethod
+    def find_columns(cls,**kwargs):
+        """
+        Class level method that returns the matching instances of the
+        given class as columns(predicate name : values), without creating
+        any RDFSubject instances. Intended for analytics over many objects.
+        cls - the class type the determines the type limits of the search
+        kwargs - predicates(list of predicate names to fetch, defaults to all
+        of the class predicates) and where(search criteria, same as find)
+        """
+        session = cls._session
+        predicates = kwargs.get('predicates')
+        if predicates is None:
+            # the auto uri is not stored as a predicate, it is the 'uri' column
+            predicates = [pred_name for pred_name in cls.predicates if not cls.__dict__[pred_name].auto_uri]
+        property_table = None
+        if cls.property_predicates:
+            property_table = cls.property_table()
+        return find_columns(cls.__name__.lower(),session,predicates,kwargs.get('where'),property_table=property_table)
+
+    @classmethod
+    def property_table(cls):
+        """
+        Returns the SQLAlchemy table holding the single valued
+        predicates of a class declared with storage = PROPERTY_TABLE
+        cls - the class
+        """
+        return get_property_table(cls.__name__.lower(),cls.property_predicates,cls._session)
+
     @classmethod
     def uri_pred(cls):
         """
@@ -174,26 +222,17 @@ class RDFSubject(object):
             attr_list_vals = []
             for single_attr_val in attr_val:
                 if isinstance(single_attr_val,RDFObjectHelper):
-                    obj_class_type = single_attr_val.get_object_type(RDFSubject)
-                    if obj_class_type:
-                        # load of the RDFSubject class in the list
-                        obj = obj_class_type.find_by_uri(single_attr_val.full_uri,True)
-                        if obj:
-                            attr_list_vals.append(obj)
-                    else:
-                        raise RDFObjectPersistanceException(2)
+                    # load of the RDFSubject class in the list
+                    obj = lazy_load(single_attr_val,RDFSubject)
+                    if obj:
+                        attr_list_vals.append(obj)
             attr_val = attr_list_vals
         else:
             # if it is not a list
             if isinstance(attr_val,RDFObjectHelper):
-                obj_class_type = attr_val.get_object_type(RDFSubject)
-                if obj_class_type:
-                    # load the RDFSubject class
-                    obj = obj_class_type.find_by_uri(attr_val.full_uri,True)
-                    # and assign as the attribute value
-                    attr_val = obj
-                else:
-                    raise RDFObjectPersistanceException(2)
+                # load the RDFSubject class
+                # and assign as the attribute value
+                attr_val = lazy_load(attr_val,RDFSubject)
         return attr_val
 
     def __str__(self):
@@ -244,6 +283,9 @@ class RDFSubject(object):
         uri = self.get_uri()
         if uri:
             complete_uri = classify_uri(self.__class__, uri)
+            if self.__class__.property_predicates:
+                # makes sure the property table is known to delete_obj
+                self.__class__.property_table()
             # check if it is an object to another subject
             if is_object(complete_uri, session):
                 # if so, cannot delete if there are active 
@@ -258,12 +300,73 @@ class RDFSubject(object):
         return deleted
         
     
+    def build_triples(self, uri):
+        """
+        Converts this RDFSubject instance's predicate values into
+        a tuple of (triples, triples_with_datatype). Does not touch the db,
+        so it can run anywhere(e.g. in a bulk loader worker process).
+        uri - the classified uri of this instance
+        """
+        triples = []
+        triples_with_datatype = []
+        auto_uri_field_name = self.auto_uri_field_name()
+        pred_names = self.__class__.predicates
+        for pred_name in pred_names:
+            if auto_uri_field_name == pred_name:
+                continue
+            pred_val = self.__dict__[pred_name]
+            # dont save None value predicates as triples
+            if pred_val == None:
+                continue
+            # if the attribute is a list or tuple
+            # we save each entry as a seprate triple
+            if isinstance(pred_val, list) or isinstance(pred_val, tuple):
+                for val in pred_val:
+                    if isinstance(val,RDFSubject):
+                        object_uri = get_object_uri(val,None)
+                        if object_uri:
+                            if val.is_persisted():
+                                # create triple
+                                triples.append((uri,pred_name,object_uri))
+                            else:
+                                # the object of this Subject has not yet been persisted
+                                raise RDFObjectPersistanceException(1)
+                        else:
+                            # raise No URI error for object
+                            raise RDFObjectNoUriException(val)
+                    else:
+                        # the predicate val is not a Subject, just a plain Python type
+                        # create quadruple
+                        triples_with_datatype.append((uri,pred_name,val.__class__.__name__,val))
+            else:
+                # not a list, single val
+                if isinstance(pred_val,RDFSubject):
+                    object_uri = get_object_uri(pred_val,None)
+                    if object_uri:
+                        if pred_val.is_persisted():
+                            # create triple
+                            triples.append((uri,pred_name,object_uri))
+                        else:
+                            raise RDFObjectPersistanceException(1)
+                    else:
+                        # raise NO URI from object
+                        raise RDFObjectNoUriException(pred_val)
+                else:
+                    # the predicate val is not a Subject, just a plain Python type
+                    #create quadruple eval of of string
+                    triples_with_datatype.append((uri,pred_name,pred_val.__class__.__name__,pred_val))
+        return (triples,triples_with_datatype)
+
+    @instrumented('save')
     def save(self):
         """
         Saves this RDFSubject class to the db
         """
         session = self.__class__._session
         saved = False
+        def failed(error):
+            # a write behind write of this object failed
+            self._persisted = False
         raw_uri = fetch_uri(self,session)
         if raw_uri:
             # clean up the URI for saving in shared datastore
@@ -272,57 +375,23 @@ class RDFSubject(object):
             if auto_uri_field_name != None:
                 # assigns auto uri val at save time
                 self.__dict__[auto_uri_field_name] = raw_uri
-            triples = []
-            triples_with_datatype = []
-            pred_names = self.__class__.predicates
-            for pred_name in pred_names:
-                if auto_uri_field_name == pred_name:
-                    continue
-                pred_val = self.__dict__[pred_name]
-                # dont save None value predicates as triples
-                if pred_val == None:
-                    continue
-                # if the attribute is a list or tuple
-                # we save each entry as a seprate triple
-                if isinstance(pred_val, list) or isinstance(pred_val, tuple):
-                    for val in pred_val:
-                        if isinstance(val,RDFSubject):
-                            object_uri = get_object_uri(val,session)
-                            if object_uri:
-                                if val.is_persisted():
-                                    # create triple
-                                    triples.append((uri,pred_name,object_uri))
-                                else:
-                                    # the object of this Subject has not yet been persisted
-                                    raise RDFObjectPersistanceException(1)
-                            else:
-                                # raise No URI error for object
-                                raise RDFObjectNoUriException(val)
-                        else:
-                            # the predicate val is not a Subject, just a plain Python type
-                            # create quadruple
-                            triples_with_datatype.append((uri,pred_name,val.__class__.__name__,val))
-                else:
-                    # not a list, single val
-                    if isinstance(pred_val,RDFSubject):
-                        object_uri = get_object_uri(pred_val,session)
-                        if object_uri:
-                            if pred_val.is_persisted():
-                                # create triple
-                                triples.append((uri,pred_name,object_uri))
-                            else:
-                                raise RDFObjectPersistanceException(1)
-                        else:
-                            # raise NO URI from object
-                            raise RDFObjectNoUriException(pred_val)
-                    else:
-                        # the predicate val is not a Subject, just a plain Python type
-                        #create quadruple eval of of string
-                        triples_with_datatype.append((uri,pred_name,pred_val.__class__.__name__,pred_val))
+            triples,triples_with_datatype = self.build_triples(uri)
+            property_pred_names = self.__class__.property_predicates
+            if property_pred_names:
+                # single valued literals go to the property row, lists and
+                # subjects stay triples(their column is left NULL)
+                property_values = {}
+                for pred_name in property_pred_names:
+                    pred_val = self.__dict__[pred_name]
+                    if isinstance(pred_val, list) or isinstance(pred_val, tuple) or isinstance(pred_val, RDFSubject):
+                        pred_val = None
+                    property_values[pred_name] = pred_val
+                triples_with_datatype = [t for t in triples_with_datatype if property_values.get(t[1]) is None]
+                save_properties(self.__class__.property_table(),uri,property_values,session,failed)
         else:
             raise RDFNoUriException(self)
         # calls triple manager here...passes triples for saving
-        saved = save_triples(triples,triples_with_datatype, session)
+        saved = save_triples(triples,triples_with_datatype, session, failed)
         if saved:
             self._persisted = True
         return saved
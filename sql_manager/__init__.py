@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine,Table, Column, Integer, String, MetaData, Sequence
-from sqlalchemy.orm import mapper
+from sqlalchemy import create_engine,Table, Column, Integer, String, MetaData, Sequence, ForeignKey, Index
+from sqlalchemy.orm import mapper, clear_mappers
 from lib import create_session
+from instrumentation import instrument_engine
 import models
+import terms
+import search
 
 """
 Initializes all state required for SQL system
@@ -9,26 +12,35 @@ including SQLAlchemy system
 """
 
 # init all state for this package
-def initialize(connect_string):
+def initialize(connect_string, echo=False, term_dictionary=False):
     """
     Initializes package state/ SQLAlchemy session state 
     
     connect_string - SQLAlchemy engine configuration string
+    echo - SQLAlchemy statement logging(False, True or 'debug')
+    term_dictionary - use the dictionary encoded storage layout
     """
     print("Initializing SQL Manager")
-    return initialize_triple_store(connect_string)
+    return initialize_triple_store(connect_string, echo, term_dictionary)
 
 # create the triple store if it is not already created
 # accepts standard sqlalchemy connect string(db+dialect//credentials)
-def initialize_triple_store(connect_string):
+def initialize_triple_store(connect_string, echo=False, term_dictionary=False):
     """
     Does the Actual Initializations.
     Configures SQLAlchemy engine and creates
     triple store if it does not exist
     
     connect_string - SQLAlchemy engine configuration string
+    echo - SQLAlchemy statement logging(False, True or 'debug'),
+    logging every statement is costly so it is off by default
+    term_dictionary - store URIs and predicate names once in a terms table
+    and integer term ids in the triple tables(the plain tables are still
+    created, the triples table's sequence hands out the auto URIs)
     """
-    engine = create_engine(connect_string, echo=True)
+    engine = create_engine(connect_string, echo=echo)
+    # count the queries issued for the instrumentation stats
+    instrument_engine(engine)
     metadata = MetaData()
     # create tables for triple store
     triples_table = Table('triples', metadata,
@@ -50,11 +62,53 @@ def initialize_triple_store(connect_string):
         Column('object_value', String(255)),
         sqlite_autoincrement = True
         )
+    if term_dictionary:
+        terms_table = Table('terms', metadata,
+            Column('id', Integer, Sequence('term_id_seq'), primary_key=True),
+            Column('term', String(255), nullable=False, unique=True),
+            sqlite_autoincrement = True
+            )
+        encoded_triples_table = Table('encoded_triples', metadata,
+            Column('id', Integer, Sequence('encoded_triple_id_seq'), primary_key=True),
+            # term ids of the URIs
+            Column('subject_id', Integer, ForeignKey('terms.id'), nullable=False),
+            Column('predicate_id', Integer, ForeignKey('terms.id'), nullable=False),
+            Column('object_id', Integer, ForeignKey('terms.id'), nullable=False),
+            sqlite_autoincrement = True
+            )
+        encoded_triples_with_datatype_table = Table('encoded_triples_with_datatype', metadata,
+            Column('id', Integer, Sequence('encoded_triple_object_id_seq'), primary_key=True),
+            Column('subject_id', Integer, ForeignKey('terms.id'), nullable=False),
+            Column('predicate_id', Integer, ForeignKey('terms.id'), nullable=False),
+            Column('object_type', String(255)),
+            Column('object_value', String(255)),
+            sqlite_autoincrement = True
+            )
+        # integer keys make these indexes a fraction of the size of string ones
+        Index('encoded_triples_subject', encoded_triples_table.c.subject_id, encoded_triples_table.c.predicate_id)
+        Index('encoded_triples_object', encoded_triples_table.c.object_id)
+        Index('encoded_triples_with_datatype_subject', encoded_triples_with_datatype_table.c.subject_id, encoded_triples_with_datatype_table.c.predicate_id)
+        Index('encoded_triples_with_datatype_value', encoded_triples_with_datatype_table.c.predicate_id, encoded_triples_with_datatype_table.c.object_value)
     # create the tables(if they dont already exist)
     metadata.create_all(engine)
+    # initialize can be called again(for another store), so the
+    # model classes are mapped anew and the layout state reset
+    clear_mappers()
+    terms.reset()
     # bind model classes to tables
-    mapper(models.Triple, triples_table)
-    mapper(models.TripleWithDatatype,triples_with_datatype_table)
+    if term_dictionary:
+        terms.configure(terms_table, encoded_triples_table, encoded_triples_with_datatype_table)
+        # the models read through selects that decode the term ids(exports),
+        # finds and writes go through the triple manager's encoded functions
+        decoded_triples = terms.decoded_triples_select(encoded_triples_table, terms_table)
+        decoded_triples_with_datatype = terms.decoded_triples_with_datatype_select(encoded_triples_with_datatype_table, terms_table)
+        mapper(models.Triple, decoded_triples, primary_key=[decoded_triples.c.id])
+        mapper(models.TripleWithDatatype, decoded_triples_with_datatype, primary_key=[decoded_triples_with_datatype.c.id])
+        search.configure(engine, encoded_triples_with_datatype_table, decoded_triples_with_datatype)
+    else:
+        mapper(models.Triple, triples_table)
+        mapper(models.TripleWithDatatype,triples_with_datatype_table)
+        search.configure(engine, triples_with_datatype_table, triples_with_datatype_table)
     session = create_session(engine)
     return session
     
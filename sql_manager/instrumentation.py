@@ -0,0 +1,151 @@
+import functools
+import logging
+import threading
+import time
+# engine events are only available in SQLAlchemy 0.7+,
+# without them queries are not counted
+try:
+    from sqlalchemy import event
+except ImportError:
+    event = None
+
+"""
+Query instrumentation. Operations of the other packages
+(find, save, find_triples, save_triples, delete_obj, lazy loads, ...) are wrapped
+with the instrumented decorator, which collects per call counters
+(queries issued, rows read, triples decoded, term id cache hits and
+misses, time) and adds them to the per operation totals returned by
+get_stats. Hooks added with
+add_hook are called with the counters of every finished call, which
+is the place to log slow calls or catch N+1 query patterns, hooks
+added with before=True are called when a call starts. Errors of the
+hooks are logged, they never fail the operation.
+Counters of nested operations(a find inside a lazy load) are added to
+every operation in progress, so each operation's counters include the
+work done on its behalf.
+"""
+
+COUNTERS = ('queries', 'rows', 'triples_decoded', 'term_cache_hits', 'term_cache_misses', 'time')
+
+# operation name -> totals of the counters, plus number of calls
+stats = {}
+# queries issued, whether or not inside an instrumented operation
+totals = {'queries' : 0}
+# hooks called after/ before every instrumented call
+hooks = []
+before_hooks = []
+stats_lock = threading.Lock()
+# per thread stack of the counters of the operations in progress
+active = threading.local()
+logger = logging.getLogger(__name__)
+
+def active_operations():
+    """
+    Returns the stack of operations in progress in this thread
+    """
+    if not hasattr(active, 'stack'):
+        active.stack = []
+    return active.stack
+
+def increment(counter, amount=1):
+    """
+    Adds to a counter of every operation in progress in this thread
+    counter - the counter name(queries, rows, triples_decoded,
+    term_cache_hits, term_cache_misses)
+    amount - the amount to add
+    """
+    for record in active_operations():
+        record[counter] += amount
+
+def instrumented(operation):
+    """
+    Decorator that collects counters for every call of the decorated function
+    operation - the name the counters are reported under
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            record = dict([(counter, 0) for counter in COUNTERS])
+            record['operation'] = operation
+            stack = active_operations()
+            stack.append(record)
+            call_hooks(before_hooks, operation, record)
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record['time'] = time.time() - start
+                stack.pop()
+                with stats_lock:
+                    operation_stats = stats.setdefault(operation, dict([(counter, 0) for counter in COUNTERS + ('calls',)]))
+                    operation_stats['calls'] += 1
+                    for counter in COUNTERS:
+                        operation_stats[counter] += record[counter]
+                call_hooks(hooks, operation, record)
+        return wrapper
+    return decorator
+
+def call_hooks(hook_list, operation, record):
+    """
+    Calls the hooks with the counters of a call, logging(not raising)
+    their errors, so a failing hook does not fail(or hide the error of)
+    an operation that may already be committed
+    """
+    for hook in list(hook_list):
+        try:
+            hook(operation, record)
+        except Exception:
+            logger.exception("instrumentation hook failed for %s", operation)
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    """
+    Engine event listener counting every statement sent to the db
+    """
+    with stats_lock:
+        totals['queries'] += 1
+    increment('queries')
+
+def instrument_engine(engine):
+    """
+    Starts counting the queries issued through the given engine
+    engine - the SQLAlchemy engine
+    """
+    if event is not None:
+        event.listen(engine, 'before_cursor_execute', count_query)
+
+def get_stats():
+    """
+    Returns a copy of the collected counters:
+    {'queries' : total queries, 'operations' : {operation name : counters}}
+    """
+    with stats_lock:
+        operations = dict([(operation, dict(counters)) for operation, counters in stats.iteritems()])
+        return {'queries' : totals['queries'], 'operations' : operations}
+
+def reset_stats():
+    """
+    Clears all collected counters
+    """
+    with stats_lock:
+        stats.clear()
+        totals['queries'] = 0
+
+def add_hook(hook, before=False):
+    """
+    Registers a callback called after every instrumented operation
+    hook - callable accepting (operation name, counters of the call)
+    before - call it when the operation starts instead(the counters are all 0)
+    """
+    if before:
+        before_hooks.append(hook)
+    else:
+        hooks.append(hook)
+
+def remove_hook(hook):
+    """
+    Unregisters a callback added with add_hook
+    """
+    if hook in before_hooks:
+        before_hooks.remove(hook)
+    else:
+        hooks.remove(hook)
@@ -1,4 +1,4 @@
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import sessionmaker, scoped_session, class_mapper
 from sqlalchemy import Sequence
 
 """
@@ -17,23 +17,74 @@ def create_session(engine):
     session = Session()
     return session
 
+def get_table(model):
+    """
+    Retrieves the SQLAlchemy Table a model class is mapped to.
+    Used for bulk(executemany) statements that bypass the ORM.
+    
+    model - the SQLAlchemy model class
+    """
+    return class_mapper(model).local_table
+
+# ids reserved ahead by get_id, when the block size is over 1
+id_pool = {'block_size' : 1, 'ids' : []}
+
+def set_id_block_size(block_size):
+    """
+    Sets how many ids get_id reserves at a time. Over 1, the block is
+    reserved and committed at once and handed out from memory, so
+    get_id does not leave a write pending on the session.
+    Ids left in the pool are dropped(leaving a gap in the sequence).
+    
+    block_size - the number of ids reserved at a time
+    """
+    id_pool['block_size'] = block_size
+    id_pool['ids'] = []
+
 def get_id(session):
     """
     Retrieves the next id reserved for the triples table.
     
     session - the current SQLAlchemy session
     """
+    if id_pool['block_size'] <= 1:
+        return reserve_ids(session, 1)[0]
+    if not id_pool['ids']:
+        id_pool['ids'] = reserve_ids(session, id_pool['block_size'])
+        session.commit()
+    return id_pool['ids'].pop(0)
+
+def reserve_ids(session, count):
+    """
+    Reserves count ids from the sequence used for the triples table
+    and returns them as a list. Ids handed out here are never
+    handed out again, so the reserved ids can be used by other
+    processes(e.g. bulk loader workers) without colliding.
+    
+    session - the current SQLAlchemy session
+    count - the number of ids to reserve
+    """
     # explicit workaround for sqlite
-    # get the last id used, add 1 to it(use it)
-    # update table with sequence + 1
+    # get the last id used, add count to it(use them)
+    # update table with sequence + count
     engine_text = str(session.bind.engine)
     if 'sqlite' in engine_text:
-        next_id = session.connection().execute("select seq from sqlite_sequence where name = 'triples';").first()[0]
-        next_id = next_id + 1
-        update_text = "update sqlite_sequence set seq = {0} where name = 'triples'".format(next_id)
-        # increment the sequence table value so we do use id again
-        session.connection().execute(update_text)
+        row = session.connection().execute("select seq from sqlite_sequence where name = 'triples';").first()
+        if row is None:
+            # nothing has been inserted into triples yet, so sqlite
+            # has not created the sequence row
+            last_id = 0
+            session.connection().execute("insert into sqlite_sequence (name, seq) values ('triples', {0})".format(count))
+        else:
+            last_id = row[0]
+            update_text = "update sqlite_sequence set seq = {0} where name = 'triples'".format(last_id + count)
+            # increment the sequence table value so we do use ids again
+            session.connection().execute(update_text)
+        ids = range(last_id + 1, last_id + count + 1)
+    elif 'postgresql' in engine_text:
+        # one round trip for the whole range
+        ids = [row[0] for row in session.connection().execute("select nextval('triple_id_seq') from generate_series(1, {0})".format(count))]
     else:
         sequence = Sequence("triple_id_seq")
-        next_id = session.connection().execute(sequence)
-    return next_id
+        ids = [session.connection().execute(sequence) for i in range(count)]
+    return ids
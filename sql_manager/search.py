@@ -0,0 +1,167 @@
+import re
+from sqlalchemy import Table, Column, Integer, String, MetaData, Index, func, select, and_, bindparam
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+"""
+Full text search over literal(string) predicate values.
+On sqlite, an FTS5 table(literal_search) indexes the string literals
+and is kept up to date by the triple manager on every save and delete.
+The literals are stored in a plain table(literal_search_keys) indexed
+on subject and predicate, which is the FTS table's external content:
+saves and deletes find their rows through the index, and triggers
+update the FTS table by rowid.
+On postgres, the literal tables are searched with tsvector expressions,
+backed by expression indexes(and trigram indexes for LIKE searches when
+the pg_trgm extension is available), so nothing needs maintaining.
+Without either, searches fall back to LIKE matching.
+"""
+
+# the tables of the indexed literals, set by configure on sqlite:
+# keys(literal_search_keys) and index(the FTS5 table)
+fts = {}
+# name of the dialect searches are compiled for
+dialect = {'name' : None}
+# python datatypes whose values are indexed
+INDEXED_TYPES = ('str', 'unicode')
+# words of a search string
+WORD = re.compile(r'\w+', re.UNICODE)
+
+# number of literals copied per statement when building the FTS index
+BACKFILL_BATCH = 10000
+
+def configure(engine, literal_table, literal_select):
+    """
+    Sets up full text search for the given engine. A new FTS index
+    is filled with the literals already in the store.
+    engine - the SQLAlchemy engine
+    literal_table - the table holding the literal object values
+    literal_select - selectable with subject_uri, predicate_uri, object_type
+    and object_value columns of the stored literals
+    """
+    dialect['name'] = engine.dialect.name
+    fts.clear()
+    if dialect['name'] == 'sqlite':
+        metadata = MetaData()
+        keys = Table('literal_search_keys', metadata,
+            Column('id', Integer, primary_key=True),
+            Column('subject_uri', String(255)),
+            Column('predicate_uri', String(255)),
+            Column('object_value', String(255)))
+        Index('literal_search_keys_subject', keys.c.subject_uri, keys.c.predicate_uri)
+        index = Table('literal_search', metadata,
+            Column('rowid', Integer, primary_key=True),
+            Column('object_value', String(255)))
+        # read and write on one connection, sqlite would lock a second one out
+        connection = engine.connect()
+        transaction = connection.begin()
+        existing = set([row[0] for row in connection.execute("select name from sqlite_master where name in ('literal_search', 'literal_search_keys')")])
+        keys.create(bind=connection, checkfirst=True)
+        if 'literal_search_keys' not in existing and 'literal_search' in existing:
+            # index of an older version, which kept the keys in the FTS table
+            connection.execute("INSERT INTO literal_search_keys (subject_uri, predicate_uri, object_value) SELECT subject_uri, predicate_uri, object_value FROM literal_search")
+            connection.execute("DROP TABLE literal_search")
+        try:
+            connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS literal_search USING fts5(object_value, content='literal_search_keys', content_rowid='id')")
+        except OperationalError:
+            # sqlite built without FTS5, searches use LIKE
+            transaction.rollback()
+            connection.close()
+            return
+        connection.execute("CREATE TRIGGER IF NOT EXISTS literal_search_insert AFTER INSERT ON literal_search_keys BEGIN INSERT INTO literal_search (rowid, object_value) VALUES (new.id, new.object_value); END")
+        connection.execute("CREATE TRIGGER IF NOT EXISTS literal_search_delete AFTER DELETE ON literal_search_keys BEGIN INSERT INTO literal_search (literal_search, rowid, object_value) VALUES ('delete', old.id, old.object_value); END")
+        if 'literal_search_keys' not in existing:
+            if 'literal_search' in existing:
+                connection.execute("INSERT INTO literal_search (literal_search) VALUES ('rebuild')")
+            else:
+                # the triggers index the copied literals
+                literals = connection.execute(select([literal_select.c.subject_uri, literal_select.c.predicate_uri, literal_select.c.object_value]).where(literal_select.c.object_type.in_(INDEXED_TYPES)))
+                rows = literals.fetchmany(BACKFILL_BATCH)
+                while rows:
+                    connection.execute(keys.insert(), [dict(row) for row in rows])
+                    rows = literals.fetchmany(BACKFILL_BATCH)
+        transaction.commit()
+        connection.close()
+        fts['keys'] = keys
+        fts['index'] = index
+    elif dialect['name'] == 'postgresql':
+        create_index(engine, "CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        create_index(engine, "CREATE INDEX {0}_search ON {0} USING gin (to_tsvector('simple', object_value))".format(literal_table.name))
+        create_index(engine, "CREATE INDEX {0}_trigram ON {0} USING gin (object_value gin_trgm_ops)".format(literal_table.name))
+
+def create_index(engine, statement):
+    """
+    Runs an index DDL statement, ignoring failures(the index
+    already exists or the extension is not available)
+    """
+    try:
+        engine.execute(statement)
+    except (OperationalError, ProgrammingError):
+        pass
+
+def index_literals(session, triples_with_datatype):
+    """
+    Adds the string literals of the given triples to the FTS index.
+    Does not commit.
+    session - the SQLAlchemy db session
+    triples_with_datatype - array of (subject, predicate, datatype, value)
+    """
+    if not fts:
+        return
+    table = fts['keys']
+    rows = [{'subject' : t[0], 'predicate' : t[1], 'value' : t[3]} for t in triples_with_datatype if t[2] in INDEXED_TYPES]
+    if rows:
+        # same as the triples, an old version of the value is replaced
+        session.execute(table.delete().where(and_(table.c.subject_uri == bindparam('subject'), table.c.predicate_uri == bindparam('predicate'), table.c.object_value == bindparam('value'))), rows)
+        session.execute(table.insert().values(subject_uri=bindparam('subject'), predicate_uri=bindparam('predicate'), object_value=bindparam('value')), rows)
+
+def unindex_predicates(session, uri, pred_names):
+    """
+    Removes the indexed literals of some predicates of a subject.
+    Does not commit.
+    """
+    if fts and pred_names:
+        table = fts['keys']
+        session.execute(table.delete().where(and_(table.c.subject_uri == uri, table.c.predicate_uri.in_(pred_names))))
+
+def unindex_subject(session, uri):
+    """
+    Removes every indexed literal of a subject. Does not commit.
+    session - the SQLAlchemy db session
+    uri - the classified uri of the subject
+    """
+    if fts:
+        table = fts['keys']
+        session.execute(table.delete().where(table.c.subject_uri == uri))
+
+def escape_like(text):
+    """
+    Escapes the LIKE wildcards(and the escape character) of a
+    text, for patterns compiled with escape='\\'
+    """
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_criterion(subject_column, value_column, predicate, text):
+    """
+    Builds the SQL criterion of a full text search of a predicate's values.
+    Every word of the text matches as a prefix, so partial words typed
+    into a search box match.
+    subject_column - the subject_uri column of the searched rows
+    value_column - the value column of the searched rows
+    predicate - the searched predicate name
+    text - the search text
+    """
+    words = WORD.findall(unicode(text))
+    if not words:
+        return value_column != None
+    if fts:
+        keys = fts['keys']
+        index = fts['index']
+        query = u" ".join([u'"{0}"*'.format(word) for word in words])
+        matching = select([keys.c.subject_uri], from_obj=[keys.join(index, index.c.rowid == keys.c.id)]).where(and_(index.c.object_value.op('MATCH')(query), keys.c.predicate_uri == predicate))
+        return subject_column.in_(matching)
+    if dialect['name'] == 'postgresql':
+        query = u" & ".join([u"{0}:*".format(word) for word in words])
+        return func.to_tsvector('simple', value_column).op('@@')(func.to_tsquery('simple', query))
+    # no full text support, every word must be contained in the value(\w
+    # matches _, a LIKE wildcard, so the words are escaped)
+    return and_(*[value_column.ilike(u"%{0}%".format(escape_like(word)), escape='\\') for word in words])
@@ -0,0 +1,198 @@
+import weakref
+from sqlalchemy import select, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from instrumentation import increment
+
+"""
+Dictionary encoding of the triple store. When enabled, URIs and
+predicate names are stored once in the terms table and the triple
+tables hold integer term ids instead of repeating the strings.
+Strings are translated to ids at the boundary, through in-process
+caches: writes look up(or insert) the ids of their terms, finds look up
+the ids of their where values and filter the encoded tables on integer
+columns, then decode only the rows they return. The Triple and
+TripleWithDatatype models are mapped onto selects that join the term
+strings back in, for the readers that stream whole tables(exports).
+New terms are inserted in the caller's transaction(without committing
+or rolling back anything else it wrote), their ids are only cached once
+that transaction commits.
+"""
+
+# tables of the dictionary encoded layout, set by configure
+tables = {}
+# term string -> term id, of committed terms
+term_cache = {}
+# term id -> term string, of committed terms
+id_cache = {}
+# session -> {term string : term id} of the terms inserted in its open transaction
+pending_terms = weakref.WeakKeyDictionary()
+# the cache is cleared when it grows past this many terms
+CACHE_SIZE = 1000000
+# number of terms looked up per IN(...) query
+LOOKUP_BATCH = 500
+
+def configure(terms_table, triples_table, triples_with_datatype_table):
+    """
+    Enables the dictionary encoded layout
+    terms_table - the table of term strings
+    triples_table - the encoded table of standard triples
+    triples_with_datatype_table - the encoded table of triples with datatype
+    """
+    tables['terms'] = terms_table
+    tables['triples'] = triples_table
+    tables['triples_with_datatype'] = triples_with_datatype_table
+    term_cache.clear()
+    id_cache.clear()
+
+def reset():
+    """
+    Disables the dictionary encoded layout and forgets the cached term ids
+    """
+    tables.clear()
+    term_cache.clear()
+    id_cache.clear()
+    pending_terms.clear()
+
+def enabled():
+    """
+    Whether the triple store uses the dictionary encoded layout
+    """
+    return len(tables) > 0
+
+def decoded_triples_select(triples_table, terms_table):
+    """
+    Builds the select exposing the encoded triples table with
+    string subject_uri, predicate_uri and object_uri columns
+    """
+    subject_terms = terms_table.alias('subject_terms')
+    predicate_terms = terms_table.alias('predicate_terms')
+    object_terms = terms_table.alias('object_terms')
+    joined = triples_table.join(subject_terms, triples_table.c.subject_id == subject_terms.c.id).join(predicate_terms, triples_table.c.predicate_id == predicate_terms.c.id).join(object_terms, triples_table.c.object_id == object_terms.c.id)
+    return select([triples_table.c.id, subject_terms.c.term.label('subject_uri'), predicate_terms.c.term.label('predicate_uri'), object_terms.c.term.label('object_uri')], from_obj=[joined]).alias('triples')
+
+def decoded_triples_with_datatype_select(triples_with_datatype_table, terms_table):
+    """
+    Builds the select exposing the encoded triples with datatype table
+    with string subject_uri and predicate_uri columns
+    """
+    subject_terms = terms_table.alias('subject_terms')
+    predicate_terms = terms_table.alias('predicate_terms')
+    joined = triples_with_datatype_table.join(subject_terms, triples_with_datatype_table.c.subject_id == subject_terms.c.id).join(predicate_terms, triples_with_datatype_table.c.predicate_id == predicate_terms.c.id)
+    return select([triples_with_datatype_table.c.id, subject_terms.c.term.label('subject_uri'), predicate_terms.c.term.label('predicate_uri'), triples_with_datatype_table.c.object_type, triples_with_datatype_table.c.object_value], from_obj=[joined]).alias('triples_with_datatype')
+
+def select_term_ids(session, terms, found):
+    """
+    Queries the ids of the given terms and adds them to the found dict.
+    Returns the terms that are not in the db.
+    """
+    terms_table = tables['terms']
+    missing = set(terms)
+    terms = list(terms)
+    for start in range(0, len(terms), LOOKUP_BATCH):
+        batch = terms[start:start + LOOKUP_BATCH]
+        rows = session.execute(select([terms_table.c.id, terms_table.c.term]).where(terms_table.c.term.in_(batch)))
+        for term_id,term in rows:
+            found[term] = term_id
+            missing.discard(term)
+    return missing
+
+def insert_terms(session, terms):
+    """
+    Inserts terms in the session's transaction, without committing it.
+    A term inserted concurrently by another process is skipped, without
+    losing the other writes of the transaction.
+    """
+    connection = session.connection()
+    rows = [{'term' : term} for term in terms]
+    if connection.dialect.name == 'sqlite':
+        # sqlite serializes writers, so only a duplicate from this
+        # transaction's own view can conflict
+        connection.execute(tables['terms'].insert().prefix_with('OR IGNORE'), rows)
+        return
+    savepoint = connection.begin_nested()
+    try:
+        connection.execute(tables['terms'].insert(), rows)
+        savepoint.commit()
+    except IntegrityError:
+        # another process inserted some of the terms first, only the
+        # savepoint is rolled back, the caller picks up their ids
+        savepoint.rollback()
+
+def term_ids(session, terms, create=True):
+    """
+    Translates term strings to term ids. Returns a dict of term : id.
+    Terms not in the cache are looked up in the db, terms not in the
+    db are inserted in the session's transaction(not committed).
+    session - the SQLAlchemy db session
+    terms - iterable of term strings
+    create - insert missing terms, when False missing terms are left
+    out of the result
+    """
+    terms = set(terms)
+    if len(term_cache) + len(terms) > CACHE_SIZE:
+        term_cache.clear()
+        id_cache.clear()
+    pending = pending_terms.get(session, {})
+    uncached = [term for term in terms if term not in term_cache and term not in pending]
+    increment('term_cache_hits', len(terms) - len(uncached))
+    increment('term_cache_misses', len(uncached))
+    if uncached:
+        # ids found before inserting are committed ones
+        missing = select_term_ids(session, uncached, term_cache)
+        id_cache.update([(term_cache[term], term) for term in uncached if term not in missing])
+        while missing and create:
+            insert_terms(session, missing)
+            # until the transaction commits, the ids may still be rolled back
+            pending = pending_terms.setdefault(session, {})
+            missing = select_term_ids(session, missing, pending)
+    ids = dict([(term, pending[term]) for term in terms if term in pending])
+    ids.update([(term, term_cache[term]) for term in terms if term in term_cache])
+    return ids
+
+def term_strings(session, ids):
+    """
+    Translates term ids(read from the triple tables) back to term strings.
+    Returns a dict of id : term. Ids not in the cache are looked up in the db.
+    session - the SQLAlchemy db session
+    ids - iterable of term ids
+    """
+    ids = set(ids)
+    if len(id_cache) + len(ids) > CACHE_SIZE:
+        term_cache.clear()
+        id_cache.clear()
+    uncached = [term_id for term_id in ids if term_id not in id_cache]
+    increment('term_cache_hits', len(ids) - len(uncached))
+    increment('term_cache_misses', len(uncached))
+    terms_table = tables['terms']
+    pending = pending_terms.get(session, {})
+    found = {}
+    for start in range(0, len(uncached), LOOKUP_BATCH):
+        batch = uncached[start:start + LOOKUP_BATCH]
+        for term_id,term in session.execute(select([terms_table.c.id, terms_table.c.term]).where(terms_table.c.id.in_(batch))):
+            # the terms of the session's open transaction may still be rolled back
+            # (and their ids handed out again), they are cached once it commits
+            if term in pending:
+                found[term_id] = term
+            else:
+                id_cache[term_id] = term
+                term_cache[term] = term_id
+    found.update([(term_id, id_cache[term_id]) for term_id in ids if term_id in id_cache])
+    return found
+
+def commit_pending_terms(session):
+    """
+    Session listener, caches the ids of the terms a transaction inserted once it commits
+    """
+    committed = pending_terms.pop(session, {})
+    term_cache.update(committed)
+    id_cache.update([(term_id, term) for term,term_id in committed.iteritems()])
+
+def drop_pending_terms(session):
+    """
+    Session listener, forgets the ids of the terms a rolled back transaction inserted
+    """
+    pending_terms.pop(session, None)
+
+event.listen(Session, 'after_commit', commit_pending_terms)
+event.listen(Session, 'after_rollback', drop_pending_terms)
@@ -0,0 +1,29 @@
+import shutil
+import tempfile
+from .. import initialize
+from ..triple_manager import write_behind
+
+"""
+Tests of the RDF Mapper. Every test module runs against a scratch
+sqlite store of its own, set up with open_store in setUpModule.
+Run with: python -m unittest discover -s rdf_mapper/tests -t .
+"""
+
+def open_store(term_dictionary=False):
+    """
+    Initializes the mapper against a new sqlite file store(the bulk loader
+    workers and the write behind thread need a db they can share).
+    Returns (session, scratch directory)
+    term_dictionary - use the dictionary encoded storage layout
+    """
+    directory = tempfile.mkdtemp(prefix='rdf_mapper_tests')
+    session = initialize("sqlite:///{0}/store.db".format(directory), term_dictionary=term_dictionary)
+    return (session, directory)
+
+def close_store(session, directory):
+    """
+    Closes a store opened by open_store and removes its scratch directory
+    """
+    write_behind.disable()
+    session.close()
+    shutil.rmtree(directory)
@@ -0,0 +1,75 @@
+import unittest
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..triple_manager import lib
+from . import open_store, close_store
+
+"""
+Columnar results of find_columns
+"""
+
+store = {}
+
+def setUpModule():
+    store['session'],store['dir'] = open_store()
+
+def tearDownModule():
+    close_store(store['session'], store['dir'])
+
+class Reading(models.RDFSubject):
+    sensor = define_uri()
+    value = define_predicate()
+    group = define_predicate()
+    tags = define_predicate()
+
+def cells(column):
+    """
+    The cells of a column as a list, None where masked
+    """
+    if lib.numpy is not None:
+        return [None if masked else cell for cell,masked in zip(column.data.tolist(), column.mask.tolist())]
+    return list(column)
+
+class FindColumnsTest(unittest.TestCase):
+
+    def test_objects_without_the_predicate_get_a_masked_row(self):
+        Reading(sensor='masked1', group='masked', value=20).save()
+        Reading(sensor='masked2', group='masked').save()
+        columns = Reading.find_columns(predicates=['value'], where={'group' : 'masked'})
+        self.assertEqual(list(columns['uri']), ['reading/masked1', 'reading/masked2'])
+        self.assertEqual(cells(columns['value']), [20, None])
+
+    def test_numeric_column_is_typed(self):
+        Reading(sensor='typed1', group='typed', value=1.5).save()
+        Reading(sensor='typed2', group='typed', value=2.5).save()
+        columns = Reading.find_columns(predicates=['value'], where={'group' : 'typed'})
+        self.assertEqual(cells(columns['value']), [1.5, 2.5])
+        if lib.numpy is not None:
+            self.assertEqual(columns['value'].dtype, lib.numpy.dtype('float64'))
+
+    def test_integers_beyond_int64(self):
+        Reading(sensor='big1', group='big', value=123456789012345678901).save()
+        Reading(sensor='big2', group='big', value=7).save()
+        columns = Reading.find_columns(predicates=['value'], where={'group' : 'big'})
+        self.assertEqual(cells(columns['value']), [123456789012345678901, 7])
+
+    def test_multi_valued_rows_are_all_lists(self):
+        Reading(sensor='multi1', group='multi', tags=['a']).save()
+        Reading(sensor='multi2', group='multi', tags=['b', 'c']).save()
+        Reading(sensor='multi3', group='multi').save()
+        columns = Reading.find_columns(predicates=['tags'], where={'group' : 'multi'})
+        self.assertEqual([sorted(cell) if cell else cell for cell in cells(columns['tags'])], [['a'], ['b', 'c'], None])
+
+    def test_without_numpy(self):
+        Reading(sensor='plain1', group='plain', value=3).save()
+        Reading(sensor='plain2', group='plain').save()
+        numpy = lib.numpy
+        lib.numpy = None
+        try:
+            columns = Reading.find_columns(predicates=['value'], where={'group' : 'plain'})
+        finally:
+            lib.numpy = numpy
+        self.assertEqual(columns['value'], [3, None])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import logging
+import unittest
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..sql_manager import instrumentation
+from . import open_store, close_store
+
+"""
+Operation counters and hooks of the instrumentation module
+"""
+
+store = {}
+
+def setUpModule():
+    store['session'],store['dir'] = open_store()
+
+def tearDownModule():
+    close_store(store['session'], store['dir'])
+
+class Gauge(models.RDFSubject):
+    code = define_uri()
+    reading = define_predicate()
+
+class RecordingHandler(logging.Handler):
+    """
+    Keeps the records logged instead of printing them
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.reset_stats()
+        self.handler = RecordingHandler()
+        instrumentation.logger.addHandler(self.handler)
+        instrumentation.logger.propagate = False
+
+    def tearDown(self):
+        instrumentation.logger.removeHandler(self.handler)
+        instrumentation.logger.propagate = True
+
+    def test_find_and_save_are_counted(self):
+        Gauge(code='counted', reading=4).save()
+        Gauge.find(where={'code' : 'counted'})
+        operations = instrumentation.get_stats()['operations']
+        self.assertEqual(operations['save']['calls'], 1)
+        self.assertEqual(operations['find']['calls'], 1)
+        self.assertTrue(operations['find']['queries'] > 0)
+        self.assertTrue(operations['find']['triples_decoded'] > 0)
+
+    def test_hooks_are_called_before_and_after(self):
+        calls = []
+        before = lambda operation, counters: calls.append(('before', operation))
+        after = lambda operation, counters: calls.append(('after', operation))
+        instrumentation.add_hook(before, before=True)
+        instrumentation.add_hook(after)
+        try:
+            Gauge.find(where={'code' : 'hooked'})
+        finally:
+            instrumentation.remove_hook(before)
+            instrumentation.remove_hook(after)
+        self.assertEqual(calls[0], ('before', 'find'))
+        self.assertEqual(calls[-1], ('after', 'find'))
+        self.assertEqual(instrumentation.hooks, [])
+        self.assertEqual(instrumentation.before_hooks, [])
+
+    def test_failing_hook_is_logged_not_raised(self):
+        def hook(operation, counters):
+            raise ValueError('broken hook')
+        instrumentation.add_hook(hook)
+        instrumentation.add_hook(hook, before=True)
+        try:
+            Gauge(code='logged', reading=1).save()
+        finally:
+            instrumentation.remove_hook(hook)
+            instrumentation.remove_hook(hook)
+        self.assertEqual(len(Gauge.find(where={'code' : 'logged'})), 1)
+        self.assertTrue(len(self.handler.records) >= 2)
+        self.assertTrue(self.handler.records[0].exc_info[0] is ValueError)
+
+    def test_wrapped_functions_keep_their_names(self):
+        self.assertEqual(models.RDFSubject.save.__name__, 'save')
+        self.assertEqual(models.RDFSubject.find.__name__, 'find')
+
+if __name__ == '__main__':
+    unittest.main()
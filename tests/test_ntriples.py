@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import unittest
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..object_manager.exceptions import RDFImportException
+from ..triple_manager import ntriples
+from . import open_store, close_store
+
+"""
+N-Triples import and export
+"""
+
+store = {}
+
+def setUpModule():
+    store['session'],store['dir'] = open_store()
+
+def tearDownModule():
+    close_store(store['session'], store['dir'])
+
+class Author(models.RDFSubject):
+    email = define_uri()
+    name = define_predicate()
+    age = define_predicate()
+    active = define_predicate()
+
+SOURCE = u"""# a comment, then a blank line
+
+<urn:rdf_mapper:author/a@x> <urn:rdf_mapper:name> "Ann \\"the\\" Author\\n" .
+<urn:rdf_mapper:author/a@x> <urn:rdf_mapper:age> "33"^^<http://www.w3.org/2001/XMLSchema#integer> .
+<urn:rdf_mapper:author/a@x> <urn:rdf_mapper:active> "true"^^<http://www.w3.org/2001/XMLSchema#boolean> .
+<urn:rdf_mapper:author/a@x> <urn:rdf_mapper:email> "a@x" .
+<urn:rdf_mapper:author/a@x> <http://xmlns.com/foaf/0.1/knows> _:b0 .
+_:b0 <http://xmlns.com/foaf/0.1/name> "Jos\\u00e9" .
+_:b0 <http://ex/p> "chat"@fr .
+<http://ex/thing> <http://ex/rel> <http://ex/other> .
+"""
+
+# the export of SOURCE, the plain and language tagged literals come back as xsd:string
+EXPORTED = set([
+    u'<urn:rdf_mapper:author/a@x> <urn:rdf_mapper:name> "Ann \\"the\\" Author\\n"^^<http://www.w3.org/2001/XMLSchema#string> .',
+    u'<urn:rdf_mapper:author/a@x> <urn:rdf_mapper:age> "33"^^<http://www.w3.org/2001/XMLSchema#integer> .',
+    u'<urn:rdf_mapper:author/a@x> <urn:rdf_mapper:active> "true"^^<http://www.w3.org/2001/XMLSchema#boolean> .',
+    u'<urn:rdf_mapper:author/a@x> <urn:rdf_mapper:email> "a@x"^^<http://www.w3.org/2001/XMLSchema#string> .',
+    u'<urn:rdf_mapper:author/a@x> <http://xmlns.com/foaf/0.1/knows> _:b0 .',
+    u'_:b0 <http://xmlns.com/foaf/0.1/name> "Jos\\u00e9"^^<http://www.w3.org/2001/XMLSchema#string> .'.encode('ascii').decode('unicode-escape'),
+    u'_:b0 <http://ex/p> "chat"^^<http://www.w3.org/2001/XMLSchema#string> .',
+    u'<http://ex/thing> <http://ex/rel> <http://ex/other> .',
+])
+
+def write(name, text):
+    path = os.path.join(store['dir'], name)
+    with io.open(path, 'w', encoding='utf-8') as out:
+        out.write(text)
+    return path
+
+def read_lines(path):
+    with io.open(path, 'r', encoding='utf-8') as source:
+        return set([line.strip() for line in source if line.strip()])
+
+def parse(path):
+    """
+    The triples of a file as the importer reads them
+    """
+    base = ntriples.DEFAULT_BASE_URI
+    triples = set()
+    for line in read_lines(path):
+        if line.startswith('#'):
+            continue
+        subject, predicate, obj_term, literal, datatype = ntriples.NTRIPLE_LINE.match(line).groups()
+        obj = ntriples.from_iri(obj_term, base) if obj_term else ntriples.from_literal(literal, datatype, base)
+        triples.add((ntriples.from_iri(subject, base), ntriples.from_iri(predicate, base), obj))
+    return triples
+
+class NTriplesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.imported = ntriples.import_ntriples(write('source.nt', SOURCE), store['session'])
+
+    def test_import_loads_typed_values(self):
+        self.assertEqual(self.imported, 8)
+        author = Author.find(where={'email' : 'a@x'}, match='first')
+        self.assertEqual(author.name, u'Ann "the" Author\n')
+        self.assertEqual(author.age, 33)
+        self.assertTrue(author.active is True)
+
+    def test_export_round_trip(self):
+        path = os.path.join(store['dir'], 'export.nt')
+        self.assertEqual(ntriples.export_ntriples(path, store['session']), 8)
+        self.assertEqual(read_lines(path), EXPORTED)
+        # the export parses back to the imported triples
+        self.assertEqual(parse(path), parse(write('source_again.nt', SOURCE)))
+
+    def test_export_classes(self):
+        path = os.path.join(store['dir'], 'authors.nt')
+        self.assertEqual(ntriples.export_ntriples(path, store['session'], classes=[Author]), 5)
+
+    def test_turtle_groups_subjects(self):
+        path = os.path.join(store['dir'], 'export.ttl')
+        self.assertEqual(ntriples.export_turtle(path, store['session']), 8)
+        text = io.open(path, 'r', encoding='utf-8').read()
+        # the author triples are grouped under 2 headings(iri objects, then literals)
+        self.assertEqual(text.count(u'<urn:rdf_mapper:author/a@x> '), 2)
+        self.assertEqual(text.count(u' ;\n    '), 4)
+        self.assertTrue(u'<http://ex/thing> <http://ex/rel> <http://ex/other> .' in text)
+
+    def test_bad_line(self):
+        path = write('bad.nt', u'<urn:rdf_mapper:author/b@x> "not a predicate" "x" .\n')
+        self.assertRaises(RDFImportException, ntriples.import_ntriples, path, store['session'])
+
+class TermsTest(unittest.TestCase):
+
+    def test_escapes_round_trip(self):
+        value = u'tab\there "quoted" back\\slash\r\n'
+        self.assertEqual(ntriples.unescape_literal(ntriples.escape_literal(value)), value)
+
+    def test_iris(self):
+        base = ntriples.DEFAULT_BASE_URI
+        self.assertEqual(ntriples.to_iri(u'person/a@x', base), u'<urn:rdf_mapper:person/a@x>')
+        self.assertEqual(ntriples.from_iri(u'<urn:rdf_mapper:person/a@x>', base), u'person/a@x')
+        for term in (u'<http://ex/p>', u'_:b0', u'<urn:other:x>'):
+            self.assertEqual(ntriples.to_iri(ntriples.from_iri(term, base), base), term)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import io
+import os
+import unittest
+from sqlalchemy import Table, Column, String, MetaData
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..object_manager.loader import bulk_load
+from ..triple_manager import ntriples
+from ..triple_manager.property_tables import TABLE_SUFFIX
+from . import open_store, close_store
+
+"""
+Classes stored in property tables(storage = PROPERTY_TABLE)
+"""
+
+store = {}
+
+def setUpModule():
+    store['session'],store['dir'] = open_store()
+
+def tearDownModule():
+    close_store(store['session'], store['dir'])
+
+class Member(models.RDFSubject):
+    storage = models.PROPERTY_TABLE
+    email = define_uri()
+    name = define_predicate()
+    age = define_predicate()
+    tags = define_predicate()
+
+class Gadget(models.RDFSubject):
+    storage = models.PROPERTY_TABLE
+    code = define_uri()
+    name = define_predicate()
+    color = define_predicate()
+
+def find_member(email):
+    return Member.find(where={'email' : email}, match='first')
+
+def literal_count(uri):
+    return store['session'].execute("select count(*) from triples_with_datatype where subject_uri = :uri", {'uri' : uri}).scalar()
+
+class PropertyTableTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        Member(email='round@x', name='Rita', age=31, tags=['a', 'b']).save()
+        member = find_member('round@x')
+        self.assertEqual(member.name, 'Rita')
+        self.assertEqual(member.age, 31)
+        # lists stay triples
+        self.assertEqual(literal_count('member/round@x'), 2)
+        row = store['session'].execute("select name, age__type from member" + TABLE_SUFFIX + " where subject_uri = 'member/round@x'").first()
+        self.assertEqual(tuple(row), ('Rita', 'int'))
+
+    def test_changed_value_replaces_the_row(self):
+        Member(email='changed@x', name='Old').save()
+        member = find_member('changed@x')
+        member.name = 'New'
+        member.save()
+        self.assertEqual(find_member('changed@x').name, 'New')
+
+    def test_bulk_loaded_object_saved_again(self):
+        records = [{'email' : 'loaded{0}@x'.format(i), 'name' : 'Loaded', 'age' : i} for i in range(5)]
+        bulk_load(records, store['session'], model=Member, processes=1)
+        self.assertEqual(literal_count('member/loaded3@x'), 3)
+        member = find_member('loaded3@x')
+        member.name = 'Saved'
+        member.save()
+        # the loaded triples are replaced by the property row, not kept next to it
+        self.assertEqual(literal_count('member/loaded3@x'), 0)
+        member = find_member('loaded3@x')
+        self.assertEqual(member.name, 'Saved')
+        self.assertEqual(member.age, 3)
+        path = os.path.join(store['dir'], 'loaded.nt')
+        ntriples.export_ntriples(path, store['session'], classes=[Member])
+        with io.open(path, 'r', encoding='utf-8') as exported:
+            lines = [line for line in exported if '<urn:rdf_mapper:member/loaded3@x>' in line]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(len([line for line in lines if '"Saved"' in line]), 1)
+
+    def test_imported_object_saved_again(self):
+        path = os.path.join(store['dir'], 'imported.nt')
+        with io.open(path, 'w', encoding='utf-8') as source:
+            source.write(u'<urn:rdf_mapper:member/imported@x> <urn:rdf_mapper:email> "imported@x" .\n')
+            source.write(u'<urn:rdf_mapper:member/imported@x> <urn:rdf_mapper:name> "Imported" .\n')
+        ntriples.import_ntriples(path, store['session'])
+        member = find_member('imported@x')
+        self.assertEqual(member.name, 'Imported')
+        member.age = 50
+        member.save()
+        self.assertEqual(literal_count('member/imported@x'), 0)
+        member = find_member('imported@x')
+        self.assertEqual((member.name, member.age), ('Imported', 50))
+
+    def test_columns_of_new_predicates_are_added(self):
+        # the table as an older version of the class(without color) created it
+        Table('gadget' + TABLE_SUFFIX, MetaData(),
+            Column('subject_uri', String(255), primary_key=True),
+            Column('name', String(255)),
+            Column('name__type', String(255))).create(bind=store['session'].bind)
+        Gadget(code='g1', name='Lamp', color='red').save()
+        gadget = Gadget.find(where={'code' : 'g1'}, match='first')
+        self.assertEqual((gadget.name, gadget.color), ('Lamp', 'red'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..sql_manager import search
+from . import open_store, close_store
+
+"""
+Where operators(__contains, __startswith, __search) and the full text index
+"""
+
+store = {}
+
+def setUpModule():
+    store['session'],store['dir'] = open_store()
+
+def tearDownModule():
+    close_store(store['session'], store['dir'])
+
+class Writer(models.RDFSubject):
+    email = define_uri()
+    name = define_predicate()
+    motto = define_predicate()
+
+def find_emails(where):
+    return sorted([str(writer.email) for writer in Writer.find(where=where)])
+
+def indexed_count(uri):
+    keys = search.fts['keys']
+    return store['session'].execute(keys.count().where(keys.c.subject_uri == uri)).scalar()
+
+class SearchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Writer(email='w0', name='John Smith', motto='write daily').save()
+        Writer(email='w1', name='Joanna Jones', motto='50%_off everything').save()
+        Writer(email='w2', name='Bob Stone', motto='50 percent off').save()
+
+    def test_contains_and_startswith_ignore_case(self):
+        self.assertEqual(find_emails({'name__contains' : 'JO'}), ['w0', 'w1'])
+        self.assertEqual(find_emails({'name__startswith' : 'bob'}), ['w2'])
+
+    def test_like_wildcards_are_escaped(self):
+        self.assertEqual(find_emails({'motto__contains' : '%_'}), ['w1'])
+        self.assertEqual(find_emails({'motto__startswith' : '50%'}), ['w1'])
+
+    def test_search_matches_word_prefixes(self):
+        self.assertEqual(find_emails({'name__search' : 'jo'}), ['w0', 'w1'])
+        self.assertEqual(find_emails({'name__search' : 'smi jo'}), ['w0'])
+        # only the searched predicate is matched
+        self.assertEqual(find_emails({'name__search' : 'daily'}), [])
+
+    def test_search_without_full_text_index(self):
+        saved = dict(search.fts)
+        search.fts.clear()
+        try:
+            self.assertEqual(find_emails({'name__search' : 'jo'}), ['w0', 'w1'])
+            # _ is a word character, matched literally(not as a LIKE wildcard)
+            self.assertEqual(find_emails({'motto__search' : '_'}), ['w1'])
+        finally:
+            search.fts.update(saved)
+
+    def test_saves_and_deletes_keep_the_index_in_step(self):
+        writer = Writer(email='w9', name='Temp Writer', motto='gone soon')
+        writer.save()
+        writer.save()
+        # name, motto and the email, once each
+        self.assertEqual(indexed_count('writer/w9'), 3)
+        self.assertEqual(find_emails({'name__search' : 'temp'}), ['w9'])
+        Writer.find(where={'email' : 'w9'}, match='first').delete()
+        self.assertEqual(indexed_count('writer/w9'), 0)
+        matches = store['session'].execute("select count(*) from literal_search where literal_search match 'temp'").scalar()
+        self.assertEqual(matches, 0)
+
+if __name__ == '__main__':
+    unittest.main()
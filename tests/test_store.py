@@ -0,0 +1,111 @@
+import unittest
+from sqlalchemy import create_engine, Table, Column, Integer, String, MetaData
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..object_manager.loader import bulk_load
+from ..sql_manager.lib import create_session, get_id
+from . import open_store, close_store
+
+"""
+Round trips through the object layer, auto URIs and the bulk loader
+"""
+
+store = {}
+
+def setUpModule():
+    store['session'],store['dir'] = open_store()
+
+def tearDownModule():
+    close_store(store['session'], store['dir'])
+
+class Person(models.RDFSubject):
+    email = define_uri()
+    age = define_predicate()
+    name = define_predicate()
+    admin = define_predicate()
+    owns = define_predicate()
+
+class Dog(models.RDFSubject):
+    uri = define_uri(auto=True)
+    nick_names = define_predicate()
+
+def find_person(email):
+    return Person.find(where={'email' : email}, match='first')
+
+class SaveFindTest(unittest.TestCase):
+
+    def test_literals_round_trip(self):
+        Person(email='literals@x', age=27, name='John', admin=False).save()
+        person = find_person('literals@x')
+        self.assertEqual(person.age, 27)
+        self.assertEqual(person.name, 'John')
+        # bool('False') is True, the stored value must not be
+        self.assertTrue(person.admin is False)
+        self.assertTrue(person._persisted)
+
+    def test_reference_round_trip(self):
+        dog = Dog(nick_names=['rex', 'spot'])
+        dog.save()
+        Person(email='reference@x', name='Ann', owns=dog).save()
+        person = find_person('reference@x')
+        # lazy loaded on access
+        self.assertEqual(str(person.owns.uri), str(dog.uri))
+
+    def test_find_where(self):
+        Person(email='where1@x', name='Where Jones').save()
+        Person(email='where2@x', name='Other').save()
+        found = Person.find(where={'name' : 'Where Jones'})
+        self.assertEqual([person.email for person in found], ['where1@x'])
+
+    def test_save_twice_stores_once(self):
+        person = Person(email='twice@x', age=30)
+        person.save()
+        person.save()
+        self.assertEqual(find_person('twice@x').age, 30)
+
+    def test_delete(self):
+        Person(email='delete@x', name='Gone').save()
+        find_person('delete@x').delete()
+        self.assertEqual(find_person('delete@x'), None)
+
+class IdTest(unittest.TestCase):
+
+    def test_get_id_on_fresh_sqlite(self):
+        # a new db, sqlite has no sequence row for triples yet
+        engine = create_engine("sqlite:///{0}/fresh.db".format(store['dir']))
+        Table('triples', MetaData(), Column('id', Integer, primary_key=True), Column('subject_uri', String(255)), sqlite_autoincrement=True).create(engine)
+        session = create_session(engine)
+        first = get_id(session)
+        second = get_id(session)
+        session.commit()
+        self.assertEqual((first, second), (1, 2))
+
+    def test_auto_uris_are_unique(self):
+        dogs = [Dog(nick_names=['auto']) for i in range(3)]
+        for dog in dogs:
+            dog.save()
+        self.assertEqual(len(set([dog.uri for dog in dogs])), 3)
+
+class BulkLoadTest(unittest.TestCase):
+
+    def test_auto_uris_are_disjoint(self):
+        saved = Dog(nick_names=['before'])
+        saved.save()
+        dogs = [Dog(nick_names=['bulk']) for i in range(250)]
+        self.assertEqual(bulk_load(dogs, store['session'], processes=3, chunk_size=40), 250)
+        after = Dog(nick_names=['after'])
+        after.save()
+        uris = [str(dog.uri) for dog in dogs] + [str(saved.uri), str(after.uri)]
+        # no id handed out twice, within the load or against get_id
+        self.assertEqual(len(set(uris)), len(uris))
+        self.assertTrue(all([dog._persisted for dog in dogs]))
+        stored = set([str(dog.uri) for dog in Dog.find()])
+        self.assertTrue(set(uris) <= stored)
+
+    def test_records(self):
+        records = [{'email' : 'bulk{0}@x'.format(i), 'age' : i} for i in range(50)]
+        self.assertEqual(bulk_load(records, store['session'], model=Person, processes=2, chunk_size=10), 50)
+        self.assertEqual(find_person('bulk7@x').age, 7)
+
+if __name__ == '__main__':
+    unittest.main()
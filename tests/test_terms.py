@@ -0,0 +1,122 @@
+import unittest
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..object_manager.exceptions import RDFDeletionException
+from ..sql_manager import terms, instrumentation
+from ..sql_manager.lib import create_session
+from ..object_manager.loader import bulk_load
+from . import open_store, close_store
+
+"""
+The dictionary encoded storage layout(term_dictionary=True)
+"""
+
+store = {}
+
+def setUpModule():
+    store['session'],store['dir'] = open_store(term_dictionary=True)
+
+def tearDownModule():
+    close_store(store['session'], store['dir'])
+
+class Keeper(models.RDFSubject):
+    email = define_uri()
+    name = define_predicate()
+    age = define_predicate()
+    cares_for = define_predicate()
+
+class Animal(models.RDFSubject):
+    uri = define_uri(auto=True)
+    kind = define_predicate()
+
+class Ranger(models.RDFSubject):
+    storage = models.PROPERTY_TABLE
+    email = define_uri()
+    name = define_predicate()
+
+def term_count():
+    return store['session'].execute(terms.tables['terms'].count()).scalar()
+
+class EncodedFindTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.animal = Animal(kind='Otter')
+        cls.animal.save()
+        Keeper(email='kim@x', name='Kim Stone', age=41, cares_for=cls.animal).save()
+        Keeper(email='lee@x', name='Lee Stone', age=29).save()
+
+    def find_emails(self, where):
+        return sorted([str(keeper.email) for keeper in Keeper.find(where=where)])
+
+    def test_where_values_are_matched(self):
+        self.assertEqual(self.find_emails({'name' : 'Kim Stone'}), ['kim@x'])
+        self.assertEqual(self.find_emails({'name__contains' : 'stone'}), ['kim@x', 'lee@x'])
+        self.assertEqual(self.find_emails({'name__startswith' : 'LEE'}), ['lee@x'])
+        self.assertEqual(self.find_emails({'name__contains' : 'stone', 'age' : 29}), ['lee@x'])
+
+    def test_reference_is_matched_and_loaded(self):
+        animal_uri = 'animal/{0}'.format(self.animal.uri)
+        keeper = Keeper.find(where={'cares_for' : animal_uri}, match='first')
+        self.assertEqual(str(keeper.email), 'kim@x')
+        self.assertEqual(keeper.cares_for.kind, 'Otter')
+        self.assertRaises(RDFDeletionException, self.animal.delete)
+
+    def test_unknown_values_match_nothing_and_add_no_terms(self):
+        count = term_count()
+        self.assertEqual(self.find_emails({'name' : 'Nobody'}), [])
+        self.assertEqual(self.find_emails({'unknown_predicate' : 'x'}), [])
+        self.assertEqual(term_count(), count)
+
+    def test_find_columns(self):
+        columns = Keeper.find_columns(predicates=['age'], where={'name__contains' : 'stone'})
+        self.assertEqual(list(columns['uri']), ['keeper/kim@x', 'keeper/lee@x'])
+        self.assertEqual(list(columns['age']), [41, 29])
+
+    def test_decoded_terms_are_cached(self):
+        Keeper.find(where={'name' : 'Kim Stone'})
+        instrumentation.reset_stats()
+        Keeper.find(where={'name' : 'Kim Stone'})
+        counters = instrumentation.get_stats()['operations']['find']
+        self.assertTrue(counters['term_cache_hits'] > 0)
+        self.assertEqual(counters['term_cache_misses'], 0)
+
+    def test_loaded_property_table_object_saved_again(self):
+        bulk_load([{'email' : 'loaded@x', 'name' : 'Loaded'}], store['session'], model=Ranger, processes=1)
+        ranger = Ranger.find(where={'email' : 'loaded@x'}, match='first')
+        ranger.name = 'Saved'
+        ranger.save()
+        self.assertEqual(Ranger.find(where={'email' : 'loaded@x'}, match='first').name, 'Saved')
+        subject_id = terms.term_ids(store['session'], ['ranger/loaded@x'])['ranger/loaded@x']
+        literals = terms.tables['triples_with_datatype']
+        self.assertEqual(store['session'].execute(literals.count().where(literals.c.subject_id == subject_id)).scalar(), 0)
+
+class TermIdsTest(unittest.TestCase):
+
+    def test_rolled_back_terms_are_not_cached(self):
+        session = store['session']
+        term_id = terms.term_ids(session, ['rolled/back'])['rolled/back']
+        terms.term_strings(session, [term_id])
+        self.assertFalse('rolled/back' in terms.term_cache)
+        self.assertFalse(term_id in terms.id_cache)
+        session.rollback()
+        self.assertEqual(terms.term_ids(session, ['rolled/back'], create=False), {})
+        terms.term_ids(session, ['rolled/back'])
+        session.commit()
+        self.assertTrue('rolled/back' in terms.term_cache)
+
+    def test_term_inserted_by_another_session(self):
+        store['session'].commit()
+        other = create_session(store['session'].bind)
+        other_id = terms.term_ids(other, ['shared/term'])['shared/term']
+        other.commit()
+        other.close()
+        terms.term_cache.clear()
+        terms.id_cache.clear()
+        session = store['session']
+        self.assertEqual(terms.term_ids(session, ['shared/term', 'own/term'])['shared/term'], other_id)
+        session.commit()
+        self.assertEqual(terms.term_strings(session, [other_id]), {other_id : 'shared/term'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import threading
+import unittest
+from sqlalchemy import create_engine
+from ..object_manager import models
+from ..object_manager.models import define_predicate, define_uri
+from ..object_manager.exceptions import RDFWriteBehindException
+from ..triple_manager import write_behind
+from ..sql_manager.lib import create_session
+from . import open_store, close_store
+
+"""
+Write behind batching of saves
+"""
+
+store = {}
+
+def setUpModule():
+    store['session'],store['dir'] = open_store()
+
+def tearDownModule():
+    close_store(store['session'], store['dir'])
+
+class Parcel(models.RDFSubject):
+    uri = define_uri(auto=True)
+    label = define_predicate()
+
+class Courier(models.RDFSubject):
+    storage = models.PROPERTY_TABLE
+    email = define_uri()
+    name = define_predicate()
+    routes = define_predicate()
+
+def bad_write(session):
+    session.execute("insert into no_such_table values (1)")
+
+def stored_labels():
+    return sorted([parcel.label for parcel in Parcel.find()])
+
+class WriteBehindTest(unittest.TestCase):
+
+    def setUp(self):
+        # nothing is written before a flush(or read) asks for it
+        write_behind.enable(store['session'], max_pending=1000, max_delay=60)
+
+    def tearDown(self):
+        try:
+            write_behind.disable()
+        except RDFWriteBehindException:
+            pass
+        for parcel in Parcel.find():
+            parcel.delete()
+
+    def test_flush_writes_the_queued_saves(self):
+        for i in range(20):
+            Parcel(label='flushed{0:02d}'.format(i)).save()
+        active = write_behind.queue['active']
+        self.assertEqual(active.written, 0)
+        write_behind.flush()
+        self.assertEqual(active.written, active.queued)
+        self.assertEqual(len(stored_labels()), 20)
+
+    def test_reads_see_pending_saves(self):
+        Parcel(label='pending').save()
+        self.assertEqual(stored_labels(), ['pending'])
+
+    def test_disable_flushes(self):
+        Parcel(label='disabled').save()
+        write_behind.disable()
+        self.assertTrue(write_behind.queue['active'] is None)
+        self.assertEqual(stored_labels(), ['disabled'])
+
+    def test_failed_write_of_another_thread_is_isolated(self):
+        errors = []
+        def other():
+            write_behind.enqueue(bad_write, (), lambda error: errors.append('failed'))
+            try:
+                write_behind.flush()
+            except RDFWriteBehindException as e:
+                errors.append(e)
+        parcels = [Parcel(label='isolated{0}'.format(i)) for i in range(3)]
+        parcels[0].save()
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+        for parcel in parcels[1:]:
+            parcel.save()
+        # the main thread's saves share the failed batch but not its error
+        write_behind.flush()
+        self.assertEqual(stored_labels(), ['isolated0', 'isolated1', 'isolated2'])
+        self.assertTrue(all([parcel._persisted for parcel in parcels]))
+        self.assertEqual(errors[0], 'failed')
+        self.assertTrue(isinstance(errors[1], RDFWriteBehindException))
+
+    def test_save_after_a_failure_is_kept(self):
+        write_behind.enqueue(bad_write, ())
+        # another thread's flush writes the failing batch, its error waits for this thread
+        thread = threading.Thread(target=write_behind.flush)
+        thread.start()
+        thread.join()
+        # the failure is not raised by the next save, which is queued whole
+        Courier(email='after@x', name='After', routes=['north', 'south']).save()
+        self.assertRaises(RDFWriteBehindException, write_behind.flush)
+        courier = Courier.find(where={'email' : 'after@x'}, match='first')
+        self.assertEqual(courier.name, 'After')
+        literals = store['session'].execute("select count(*) from triples_with_datatype where subject_uri = 'courier/after@x'").scalar()
+        self.assertEqual(literals, 2)
+
+    def test_saves_sharing_a_failed_batch_are_written_whole(self):
+        write_behind.enqueue(bad_write, ())
+        Courier(email='shared@x', name='Shared', routes=['east']).save()
+        self.assertRaises(RDFWriteBehindException, write_behind.flush)
+        self.assertEqual(Courier.find(where={'email' : 'shared@x'}, match='first').name, 'Shared')
+
+class InMemoryTest(unittest.TestCase):
+
+    def test_in_memory_sqlite_is_rejected(self):
+        # every connection to an in memory db gets a db of its own
+        session = create_session(create_engine("sqlite://"))
+        self.assertRaises(RDFWriteBehindException, write_behind.enable, session)
+        self.assertTrue(write_behind.queue['active'] is None)
+        session.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+from sqlalchemy import select, or_
+from sqlalchemy.sql.expression import false
+from ..sql_manager.models import Triple, TripleWithDatatype
+from ..sql_manager import terms
+import lib
+
+"""
+The dictionary encoded layout(see sql_manager.terms) of the triple
+manager functions. Triples arrive with string URIs, are translated to
+term ids at this boundary and written to the encoded tables. Finds
+translate their where values to term ids, filter the encoded tables on
+their integer columns and decode only the rows they return.
+"""
+
+def triple_terms(triples,triples_with_datatype):
+    """
+    Collects every term string used by the given triples
+    """
+    used_terms = set()
+    for t in triples:
+        used_terms.update((t[0],t[1],t[2]))
+    for t in triples_with_datatype:
+        used_terms.update((t[0],t[1]))
+    return used_terms
+
+def write_triples(triples,triples_with_datatype, session):
+    """
+    Encoded version of triple_manager.lib.write_triples, replaces
+    old versions of the triples. Nothing is committed, new terms
+    are committed with the triples.
+    """
+    ids = terms.term_ids(session, triple_terms(triples,triples_with_datatype))
+    triples_table = terms.tables['triples']
+    triples_with_datatype_table = terms.tables['triples_with_datatype']
+    for t in triples:
+        subject_id,predicate_id,object_id = ids[t[0]],ids[t[1]],ids[t[2]]
+        # delete old version of triple if it exists
+        session.execute(triples_table.delete().where(triples_table.c.subject_id == subject_id).where(triples_table.c.predicate_id == predicate_id).where(triples_table.c.object_id == object_id))
+        session.execute(triples_table.insert(), {'subject_id' : subject_id, 'predicate_id' : predicate_id, 'object_id' : object_id})
+    for t in triples_with_datatype:
+        subject_id,predicate_id = ids[t[0]],ids[t[1]]
+        object_value = str(t[3])
+        session.execute(triples_with_datatype_table.delete().where(triples_with_datatype_table.c.subject_id == subject_id).where(triples_with_datatype_table.c.predicate_id == predicate_id).where(triples_with_datatype_table.c.object_value == object_value))
+        session.execute(triples_with_datatype_table.insert(), {'subject_id' : subject_id, 'predicate_id' : predicate_id, 'object_type' : t[2], 'object_value' : object_value})
+    return True
+
+def insert_triples(triples,triples_with_datatype, session):
+    """
+    Encoded version of triple_manager.lib.insert_triples, one
+    executemany statement per table
+    """
+    ids = terms.term_ids(session, triple_terms(triples,triples_with_datatype))
+    if triples:
+        rows = [{'subject_id' : ids[t[0]], 'predicate_id' : ids[t[1]], 'object_id' : ids[t[2]]} for t in triples]
+        session.execute(terms.tables['triples'].insert(), rows)
+    if triples_with_datatype:
+        rows = [{'subject_id' : ids[t[0]], 'predicate_id' : ids[t[1]], 'object_type' : t[2], 'object_value' : t[3]} for t in triples_with_datatype]
+        session.execute(terms.tables['triples_with_datatype'].insert(), rows)
+    session.commit()
+    return True
+
+def delete_triples(uri,session):
+    """
+    Encoded version of the deletion of all triples of a subject.
+    The subject's term is left in the terms table.
+    """
+    subject_id = terms.term_ids(session, [uri], create=False).get(uri)
+    if subject_id is not None:
+        triples_table = terms.tables['triples']
+        triples_with_datatype_table = terms.tables['triples_with_datatype']
+        session.execute(triples_table.delete().where(triples_table.c.subject_id == subject_id))
+        session.execute(triples_with_datatype_table.delete().where(triples_with_datatype_table.c.subject_id == subject_id))
+    session.commit()
+    return True
+
+def delete_literal_triples(uri, pred_names, session):
+    """
+    Encoded version of triple_manager.property_tables.delete_literal_triples
+    """
+    ids = terms.term_ids(session, [uri] + list(pred_names), create=False)
+    predicate_ids = [ids[pred_name] for pred_name in pred_names if pred_name in ids]
+    if uri in ids and predicate_ids:
+        triples_with_datatype_table = terms.tables['triples_with_datatype']
+        session.execute(triples_with_datatype_table.delete().where(triples_with_datatype_table.c.subject_id == ids[uri]).where(triples_with_datatype_table.c.predicate_id.in_(predicate_ids)))
+
+def class_subject_ids(cls_name):
+    """
+    Select of the term ids of the subjects of a class
+    cls_name - the lower case class name
+    """
+    terms_table = terms.tables['terms'].alias()
+    return select([terms_table.c.id]).where(terms_table.c.term.like("{0}/%".format(cls_name)))
+
+def where_terms(where_dict):
+    """
+    The term strings a where dict is matched with: its predicate
+    names and auto uris(other values may be literals, which are not terms)
+    """
+    used_terms = set()
+    for attribute,value in where_dict.iteritems():
+        if attribute == 'auto_uri':
+            used_terms.add(value)
+        else:
+            used_terms.add(lib.split_where_attribute(attribute)[0])
+    return used_terms
+
+def where_subjects_filter(session, column, where_dict, property_table=None, uri_column=False):
+    """
+    Encoded version of triple_manager.lib.where_subjects_filter. Builds a
+    list of SQL criteria restricting the given column to the subjects
+    matching every attribute : value pair of the where dict.
+    session - the SQLAlchemy db session
+    column - the subject_id column to restrict
+    where_dict - dictionary of the object attribute : value
+    property_table - the class's property table, also searched when given
+    uri_column - the column holds subject uris(of a property table) instead of term ids
+    """
+    terms_table = terms.tables['terms']
+    # unknown terms match nothing, so they are not inserted
+    ids = terms.term_ids(session, where_terms(where_dict), create=False)
+    criteria = []
+    for attribute,value in where_dict.iteritems():
+        if attribute == 'auto_uri':
+            if uri_column:
+                criteria.append(column == value)
+            else:
+                criteria.append(column == ids.get(value))
+            continue
+        attribute,operator = lib.split_where_attribute(attribute)
+        # the subjects matching the attribute, as selects of term ids
+        matches = []
+        predicate_id = ids.get(attribute)
+        if predicate_id is not None:
+            # aliases, so the subqueries are not correlated with a find
+            # reading the same table
+            literal_table = terms.tables['triples_with_datatype'].alias()
+            subject_terms = terms_table.alias()
+            subject_uri = select([subject_terms.c.term]).where(subject_terms.c.id == literal_table.c.subject_id).as_scalar()
+            matches.append(select([literal_table.c.subject_id]).where(literal_table.c.predicate_id == predicate_id).where(lib.value_criterion(subject_uri,literal_table.c.object_value,attribute,operator,value)))
+            # the value's term id is looked up by the db(on the unique
+            # term index), so literal values cost no extra round trip
+            object_table = terms.tables['triples'].alias()
+            object_terms = terms_table.alias()
+            object_criterion = object_table.c.object_id.in_(select([object_terms.c.id]).where(lib.value_criterion(object_terms.c.term,object_terms.c.term,attribute,operator,value,uri_values=True)))
+            matches.append(select([object_table.c.subject_id]).where(object_table.c.predicate_id == predicate_id).where(object_criterion))
+        if uri_column:
+            uri_terms = terms_table.alias()
+            matches = [select([uri_terms.c.term]).where(uri_terms.c.id.in_(match)) for match in matches]
+        if property_table is not None and attribute in property_table.c:
+            property_criterion = lib.value_criterion(property_table.c.subject_uri,property_table.c[attribute],attribute,operator,value)
+            if uri_column:
+                matches.append(select([property_table.c.subject_uri]).where(property_criterion))
+            else:
+                property_terms = terms_table.alias()
+                matches.append(select([property_terms.c.id], from_obj=[property_table.join(property_terms, property_terms.c.term == property_table.c.subject_uri)]).where(property_criterion))
+        if matches:
+            criteria.append(or_(*[column.in_(match) for match in matches]))
+        else:
+            criteria.append(false())
+    return criteria
+
+def decoded_rows(session, statement, id_positions, batch_size=10000):
+    """
+    Runs a select of an encoded table and streams its rows as tuples,
+    with the term ids at the given positions decoded to term strings
+    session - the SQLAlchemy db session
+    statement - the select
+    id_positions - positions of the term id columns in the rows
+    batch_size - the number of rows fetched from the db at a time
+    """
+    rows = session.execute(statement)
+    batch = rows.fetchmany(batch_size)
+    while batch:
+        strings = terms.term_strings(session, set([row[position] for row in batch for position in id_positions]))
+        for row in batch:
+            row = list(row)
+            for position in id_positions:
+                row[position] = strings[row[position]]
+            yield tuple(row)
+        batch = rows.fetchmany(batch_size)
+
+def subject_selects(session, cls_name, where_dict=None, property_table=None):
+    """
+    The selects of the triples and triples with datatype of the objects
+    of a class matching a where dict. An auto_uri in the where dict
+    selects that object only.
+    """
+    triples_table = terms.tables['triples']
+    triples_with_datatype_table = terms.tables['triples_with_datatype']
+    triple_rows = select([triples_table.c.id, triples_table.c.subject_id, triples_table.c.predicate_id, triples_table.c.object_id])
+    literal_rows = select([triples_with_datatype_table.c.id, triples_with_datatype_table.c.subject_id, triples_with_datatype_table.c.predicate_id, triples_with_datatype_table.c.object_type, triples_with_datatype_table.c.object_value])
+    auto_uri = where_dict.get('auto_uri') if where_dict else None
+    if auto_uri:
+        subject_id = terms.term_ids(session, [auto_uri], create=False).get(auto_uri)
+        return (triple_rows.where(triples_table.c.subject_id == subject_id), literal_rows.where(triples_with_datatype_table.c.subject_id == subject_id))
+    subjects = class_subject_ids(cls_name)
+    triple_rows = triple_rows.where(triples_table.c.subject_id.in_(subjects))
+    literal_rows = literal_rows.where(triples_with_datatype_table.c.subject_id.in_(subjects))
+    if where_dict:
+        for criterion in where_subjects_filter(session, triples_table.c.subject_id, where_dict, property_table):
+            triple_rows = triple_rows.where(criterion)
+        for criterion in where_subjects_filter(session, triples_with_datatype_table.c.subject_id, where_dict, property_table):
+            literal_rows = literal_rows.where(criterion)
+    return (triple_rows,literal_rows)
+
+def find_triples(cls_name, session, where_dict=None, property_table=None):
+    """
+    Encoded version of triple_manager.lib.find_triples. Returns the same
+    tuple of (array of triple objects, array of triple_with_datatype
+    objects), the objects are not added to the session.
+    property_table - the class's property table, searched by the where dict
+    """
+    triple_rows,literal_rows = subject_selects(session, cls_name, where_dict, property_table)
+    triples = []
+    for triple_id,subject_uri,predicate_uri,object_uri in decoded_rows(session, triple_rows, (1,2,3)):
+        triple = Triple()
+        triple.id = triple_id
+        triple.subject_uri = subject_uri
+        triple.predicate_uri = predicate_uri
+        triple.object_uri = object_uri
+        triples.append(triple)
+    triples_with_datatype = []
+    for triple_id,subject_uri,predicate_uri,object_type,object_value in decoded_rows(session, literal_rows, (1,2)):
+        triple = TripleWithDatatype()
+        triple.id = triple_id
+        triple.subject_uri = subject_uri
+        triple.predicate_uri = predicate_uri
+        triple.object_type = object_type
+        triple.object_value = object_value
+        triples_with_datatype.append(triple)
+    return (triples,triples_with_datatype)
+
+def column_sources(cls_name, session, predicates=None, where_dict=None, batch_size=10000, property_table=None):
+    """
+    Encoded version of triple_manager.lib.column_sources
+    """
+    triples_table = terms.tables['triples']
+    triples_with_datatype_table = terms.tables['triples_with_datatype']
+    triple_rows,literal_rows = subject_selects(session, cls_name, where_dict, property_table)
+    subject_ids = set()
+    for rows,table in ((triple_rows,triples_table),(literal_rows,triples_with_datatype_table)):
+        subject_ids.update([row[0] for row in session.execute(rows.with_only_columns([table.c.subject_id]).distinct())])
+    subjects = set(terms.term_strings(session, subject_ids).itervalues())
+    property_rows = None
+    if property_table is not None:
+        property_rows = select([property_table]).where(property_table.c.subject_uri.like("{0}/%".format(cls_name)))
+        if where_dict:
+            for criterion in where_subjects_filter(session, property_table.c.subject_uri, where_dict, property_table, uri_column=True):
+                property_rows = property_rows.where(criterion)
+        subjects.update([row[0] for row in session.execute(property_rows.with_only_columns([property_table.c.subject_uri]))])
+    if predicates:
+        predicate_ids = terms.term_ids(session, predicates, create=False).values()
+        triple_rows = triple_rows.where(triples_table.c.predicate_id.in_(predicate_ids or [None]))
+        literal_rows = literal_rows.where(triples_with_datatype_table.c.predicate_id.in_(predicate_ids or [None]))
+    literal_cells = (row[1:] for row in decoded_rows(session, literal_rows, (1,2), batch_size))
+    object_cells = (row[1:] for row in decoded_rows(session, triple_rows, (1,2,3), batch_size))
+    return (subjects,literal_cells,object_cells,property_rows)
+
+def is_object(uri, session):
+    """
+    Encoded version of the check whether a uri is referenced by a triple
+    """
+    object_id = terms.term_ids(session, [uri], create=False).get(uri)
+    if object_id is None:
+        return False
+    triples_table = terms.tables['triples']
+    return session.execute(select([triples_table.c.id]).where(triples_table.c.object_id == object_id).limit(1)).first() is not None
@@ -1,4 +1,18 @@
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Query
 from ..sql_manager.models import Triple, TripleWithDatatype
+from ..sql_manager.lib import get_table
+from ..sql_manager.instrumentation import instrumented, increment
+from ..sql_manager import terms
+from ..sql_manager import search
+import encoded
+import write_behind
+# numpy is optional, without it columnar results are plain lists
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 """
 Collection of functions that operate on in memory triples.
 They serve as the interface between the RDF Model classes
@@ -6,16 +20,41 @@ and the SQLAlchemty Model classes. They disassemble RDF models
 into triples consumable by SQLAlchemy models.
 """
 
-def save_triples(triples,triples_with_datatype, session):
+@instrumented('save_triples')
+def save_triples(triples,triples_with_datatype, session, failed=None):
     """
     Takes triples that represent an RDFSubject's properties
     and saves them as SQLAlchemy model objects
     
+    triples - array of triples(standard)
+    triples_with_datatype - array of triples(where object is represented as
+    two entries; its python datatype and its value)
+    session - the SQLAlchemy db session
+    failed - with write behind on, called with the exception if the queued write fails
+    """
+    # with write behind on, the flushing thread writes and commits them
+    if write_behind.enqueue(write_triples, (triples, triples_with_datatype), failed):
+        return True
+    write_triples(triples,triples_with_datatype, session)
+    session.commit() 
+    # if not true returned, then we can assume some exception has been raised
+    # an explicit True return simply allows this method to be used in conditional statements if required
+    return True
+
+def write_triples(triples,triples_with_datatype, session):
+    """
+    Writes the triples of save_triples, without committing them
+    
     triples - array of triples(standard)
     triples_with_datatype - array of triples(where object is represented as
     two entries; its python datatype and its value)
     session - the SQLAlchemy db session
     """
+    # keep the full text index in step, committed with the triples
+    search.index_literals(session, triples_with_datatype)
+    if terms.enabled():
+        # the models are read only in the dictionary encoded layout
+        return encoded.write_triples(triples,triples_with_datatype, session)
     # save each triple as a sql Triple object
     for t in triples:
         # construct the triple instance
@@ -37,11 +76,35 @@ def save_triples(triples,triples_with_datatype, session):
         # delete old version of triple
         session.query(TripleWithDatatype).filter(TripleWithDatatype.subject_uri == triple.subject_uri).filter(TripleWithDatatype.predicate_uri == triple.predicate_uri).filter(TripleWithDatatype.object_value == triple.object_value).delete()
         session.add(triple)
-    session.commit() 
-    # if not true returned, then we can assume some exception has been raised
-    # an explicit True return simply allows this method to be used in conditional statements if required
     return True
 
+@instrumented('insert_triples')
+def insert_triples(triples,triples_with_datatype, session):
+    """
+    Bulk inserts triples with one executemany statement per table,
+    bypassing the ORM. Unlike save_triples, old versions of the triples
+    are not deleted, so this is meant for loading new data.
+    
+    triples - array of triples(standard)
+    triples_with_datatype - array of triples(where object is represented as
+    two entries; its python datatype and its value)
+    session - the SQLAlchemy db session
+    """
+    # queued saves go first, so they cannot overwrite the inserted data
+    write_behind.flush()
+    search.index_literals(session, triples_with_datatype)
+    if terms.enabled():
+        return encoded.insert_triples(triples,triples_with_datatype, session)
+    if triples:
+        rows = [{'subject_uri' : t[0], 'predicate_uri' : t[1], 'object_uri' : t[2]} for t in triples]
+        session.execute(get_table(Triple).insert(), rows)
+    if triples_with_datatype:
+        rows = [{'subject_uri' : t[0], 'predicate_uri' : t[1], 'object_type' : t[2], 'object_value' : t[3]} for t in triples_with_datatype]
+        session.execute(get_table(TripleWithDatatype).insert(), rows)
+    session.commit()
+    return True
+
+@instrumented('find_triples')
 def find_triples(cls_name,session,where_dict=None):
     """
     queries the db via the SQLAlchemy model classes 
@@ -67,6 +130,13 @@ def find_triples(cls_name,session,where_dict=None):
     # In one query, it find the matching rows, but also self joins to get other triples belonging to the object
     # and full joins with the other table.
     # This way, we get all the triples of the object, at one time from both tables
+    # reads see the saves still queued for writing
+    write_behind.flush()
+    if terms.enabled():
+        result = encoded.find_triples(cls_name,session,where_dict)
+        session.commit()
+        increment('rows', len(result[0]) + len(result[1]))
+        return result
     find_subjects = False
     # format the class name a bit before using it to query
     # against subject_uri vals(of either model)
@@ -89,11 +159,13 @@ def find_triples(cls_name,session,where_dict=None):
             # in the where dict to find the exact set of triples we are interested in.
             # (equivalent to WHERE clause in SQL....so this is our WHERE operation across multiple triples)
             for attribute,value in where_dict.iteritems():
+                # attribute may carry an operator(name__contains)
+                attribute,operator = split_where_attribute(attribute)
                 # for each sqlalchemy model type, find the triples that have matching predicate and object vals 
                 triples_with_datatype = triples_with_datatype.filter(TripleWithDatatype.predicate_uri == attribute)
-                triples_with_datatype = triples_with_datatype.filter(TripleWithDatatype.object_value == str(value))
+                triples_with_datatype = triples_with_datatype.filter(value_criterion(TripleWithDatatype.subject_uri,TripleWithDatatype.object_value,attribute,operator,value))
                 triples = triples.filter(Triple.predicate_uri == attribute)
-                triples = triples.filter(Triple.object_uri == str(value))
+                triples = triples.filter(value_criterion(Triple.subject_uri,Triple.object_uri,attribute,operator,value,uri_values=True))
             # this means we now have a collection of properties that correctly match what we were looking for
             # ....now we need to find the rest of the properties attached to these objects(well we cant just return 
             # only part of an object!)
@@ -126,6 +198,246 @@ def find_triples(cls_name,session,where_dict=None):
             # when we add them back to the main lists, all dupes are removed automatically :)
             triples = triples + sub_triples
             triples_with_datatype = triples_with_datatype + sub_triples_datatype
+    increment('rows', len(triples) + len(triples_with_datatype))
     # return both lists in a tuple
     return (triples,triples_with_datatype)
-    
+
+# suffix of the property table columns holding a predicate's python datatype
+TYPE_COLUMN_SUFFIX = '__type'
+
+# python datatype names(as stored in object_type) that have a
+# fixed width numpy representation
+NUMPY_DTYPES = {'int' : 'int64', 'long' : 'int64', 'float' : 'float64', 'bool' : 'bool'}
+
+def convert_value(obj_type, obj_value):
+    """
+    Converts a stored object value back to its python datatype
+    obj_type - the string name of the python datatype
+    obj_value - the string value stored in the db
+    """
+    if obj_type == 'bool':
+        # bool('False') is True, so compare against the stored string
+        return obj_value == 'True'
+    return eval(obj_type)(obj_value)
+
+# operators a where attribute can end with(name__contains), no operator means equality
+WHERE_OPERATORS = ('contains', 'startswith', 'search')
+
+def split_where_attribute(attribute):
+    """
+    Splits a where clause attribute into (predicate name, operator).
+    The operator is None for plain equality.
+    attribute - the where dict key(name, name__startswith, ...)
+    """
+    pred_name,separator,operator = attribute.rpartition('__')
+    if separator and operator in WHERE_OPERATORS:
+        return (pred_name,operator)
+    return (attribute,None)
+
+def value_criterion(subject_column, value_column, pred_name, operator, value, uri_values=False):
+    """
+    Builds the SQL criterion matching a value column against a where value
+    subject_column - the subject_uri column of the matched rows
+    value_column - the object value(or object uri) column of the matched rows
+    pred_name - the predicate the value belongs to
+    operator - None(equality), contains, startswith or search
+    value - the where value
+    uri_values - the column holds object uris, which are not in the full
+    text index, so search matches them like contains
+    """
+    if operator is None:
+        return value_column == str(value)
+    if operator == 'search' and not uri_values:
+        return search.search_criterion(subject_column, value_column, pred_name, value)
+    # escape LIKE wildcards in the searched text, ILIKE so the match ignores
+    # case on every db(sqlite's LIKE does, postgres's does not)
+    text = search.escape_like(unicode(value))
+    if operator == 'startswith':
+        return value_column.ilike(text + u'%', escape='\\')
+    return value_column.ilike(u'%' + text + u'%', escape='\\')
+
+def where_subjects_filter(column, where_dict, property_table=None):
+    """
+    Builds a list of SQL criteria restricting the given subject_uri
+    column to the subjects matching every attribute : value pair
+    of the where dict. Matches are looked for in both tables, so
+    both literal and object(reference) predicates can be searched.
+    column - the subject_uri column to restrict
+    where_dict - dictionary of the object attribute : value
+    property_table - the class's property table, also searched when given
+    """
+    criteria = []
+    for attribute,value in where_dict.iteritems():
+        if attribute == 'auto_uri':
+            criteria.append(column == value)
+            continue
+        attribute,operator = split_where_attribute(attribute)
+        literal_subjects = Query(TripleWithDatatype.subject_uri).filter(TripleWithDatatype.predicate_uri == attribute).filter(value_criterion(TripleWithDatatype.subject_uri,TripleWithDatatype.object_value,attribute,operator,value))
+        object_subjects = Query(Triple.subject_uri).filter(Triple.predicate_uri == attribute).filter(value_criterion(Triple.subject_uri,Triple.object_uri,attribute,operator,value,uri_values=True))
+        matches = [column.in_(literal_subjects.subquery()), column.in_(object_subjects.subquery())]
+        if property_table is not None and attribute in property_table.c:
+            matches.append(column.in_(select([property_table.c.subject_uri]).where(value_criterion(property_table.c.subject_uri,property_table.c[attribute],attribute,operator,value))))
+        criteria.append(or_(*matches))
+    return criteria
+
+@instrumented('find_columns')
+def find_columns(cls_name,session,predicates=None,where_dict=None,batch_size=10000,property_table=None):
+    """
+    Queries the triples of the given class and pivots them into a
+    column oriented result, without building RDFSubject instances.
+    Returns a dict of predicate name : column, plus a 'uri' column holding
+    the subject uri of each row. Every object of the class matching the where
+    dict gets a row, whether or not it has the requested predicates. With numpy installed, every column is a
+    numpy masked array(masked where the object has no value for the predicate),
+    typed from object_type when a predicate holds a single numeric/bool type.
+    Without numpy, columns are lists with None for missing values.
+    Multi valued predicates(more than one value for some object) produce a
+    list in every row that has values. Reference predicates
+    hold the object uri.
+
+    cls_name - The string class name of the type of object we are searching for
+    session - the SQLAlchemy session
+    predicates - list of predicate names to fetch(all predicates if None)
+    where_dict - dictionary of the object attribute : value used to specifiy the
+    rows we are interested in.
+    batch_size - the number of rows fetched from the db at a time
+    property_table - the class's property table(for classes stored in one)
+    """
+    write_behind.flush()
+    if terms.enabled():
+        subjects,literal_cells,object_cells,property_rows = encoded.column_sources(cls_name,session,predicates,where_dict,batch_size,property_table)
+    else:
+        subjects,literal_cells,object_cells,property_rows = column_sources(cls_name,session,predicates,where_dict,batch_size,property_table)
+    uris = sorted(subjects)
+    # subject uri -> row number in the result
+    row_numbers = dict([(uri,row) for row,uri in enumerate(uris)])
+    # predicate name -> (row numbers, object types, raw values)
+    cells = {}
+    def add_cell(sub_uri,pred_uri,obj_type,obj_value):
+        row = row_numbers[sub_uri]
+        pred_cells = cells.get(pred_uri)
+        if pred_cells is None:
+            pred_cells = ([],[],[])
+            cells[pred_uri] = pred_cells
+        pred_cells[0].append(row)
+        pred_cells[1].append(obj_type)
+        pred_cells[2].append(obj_value)
+    # stream the rows from the db in batches
+    for sub_uri,pred_uri,obj_type,obj_value in literal_cells:
+        add_cell(sub_uri,pred_uri,obj_type,obj_value)
+    for sub_uri,pred_uri,obj_uri in object_cells:
+        add_cell(sub_uri,pred_uri,None,obj_uri)
+    if property_table is not None:
+        # the single valued literals of the class, one row per object
+        property_names = [pred_uri for pred_uri in (predicates or []) if pred_uri in property_table.c]
+        if not predicates:
+            property_names = [c.name for c in property_table.c if c.name != 'subject_uri' and not c.name.endswith(TYPE_COLUMN_SUFFIX)]
+        for row in session.execute(property_rows):
+            for pred_uri in property_names:
+                if row[pred_uri] is not None:
+                    add_cell(row['subject_uri'],pred_uri,row[pred_uri + TYPE_COLUMN_SUFFIX],row[pred_uri])
+    session.commit()
+    increment('rows', sum([len(pred_cells[0]) for pred_cells in cells.itervalues()]))
+    row_count = len(uris)
+    columns = {}
+    for pred_uri in (predicates or cells.keys()):
+        rows,obj_types,obj_values = cells.get(pred_uri,([],[],[]))
+        columns[pred_uri] = build_column(row_count,rows,obj_types,obj_values)
+    if numpy is not None:
+        columns['uri'] = numpy.ma.MaskedArray(numpy.array(uris, dtype=object), mask=False)
+    else:
+        columns['uri'] = uris
+    return columns
+
+def column_sources(cls_name,session,predicates=None,where_dict=None,batch_size=10000,property_table=None):
+    """
+    The sources of the cells of find_columns. Returns a tuple of
+    (set of the matching subject uris, iterable of (subject, predicate,
+    object_type, object_value) of the literals, iterable of (subject,
+    predicate, object uri) of the references, select of the matching
+    property table rows(None without a property table))
+    """
+    cls_name_query_str = "{0}/%".format(cls_name)
+    property_rows = None
+    # only select the columns we need...no sql model instances are created
+    literal_rows = session.query(TripleWithDatatype.subject_uri,TripleWithDatatype.predicate_uri,TripleWithDatatype.object_type,TripleWithDatatype.object_value).filter(TripleWithDatatype.subject_uri.like(cls_name_query_str))
+    object_rows = session.query(Triple.subject_uri,Triple.predicate_uri,Triple.object_uri).filter(Triple.subject_uri.like(cls_name_query_str))
+    if where_dict:
+        for criterion in where_subjects_filter(TripleWithDatatype.subject_uri, where_dict, property_table):
+            literal_rows = literal_rows.filter(criterion)
+        for criterion in where_subjects_filter(Triple.subject_uri, where_dict, property_table):
+            object_rows = object_rows.filter(criterion)
+    # every object matching the class and where clause gets a row, taken before
+    # the predicate filter, so objects without the requested predicates are masked rows
+    subject_selects = [literal_rows.with_entities(TripleWithDatatype.subject_uri).distinct().statement, object_rows.with_entities(Triple.subject_uri).distinct().statement]
+    if property_table is not None:
+        property_rows = select([property_table]).where(property_table.c.subject_uri.like(cls_name_query_str))
+        if where_dict:
+            for criterion in where_subjects_filter(property_table.c.subject_uri, where_dict, property_table):
+                property_rows = property_rows.where(criterion)
+        subject_selects.append(property_rows.with_only_columns([property_table.c.subject_uri]))
+    subjects = set()
+    for subject_select in subject_selects:
+        subjects.update([row[0] for row in session.execute(subject_select)])
+    if predicates:
+        literal_rows = literal_rows.filter(TripleWithDatatype.predicate_uri.in_(predicates))
+        object_rows = object_rows.filter(Triple.predicate_uri.in_(predicates))
+    # streamed from the db in batches
+    literal_cells = literal_rows.order_by(TripleWithDatatype.subject_uri).yield_per(batch_size)
+    object_cells = object_rows.order_by(Triple.subject_uri).yield_per(batch_size)
+    return (subjects,literal_cells,object_cells,property_rows)
+
+def build_column(row_count,rows,obj_types,obj_values):
+    """
+    Pivots the cells of a single predicate into a column
+    of length row_count
+    row_count - the number of rows(objects) in the result
+    rows - the row number of each cell
+    obj_types - the object_type of each cell(None for object uris)
+    obj_values - the raw value of each cell
+    """
+    distinct_types = set(obj_types)
+    multi_valued = len(set(rows)) != len(rows)
+    single_type = None
+    if len(distinct_types) == 1:
+        single_type = list(distinct_types)[0]
+    dtype = NUMPY_DTYPES.get(single_type)
+    values = None
+    if numpy is not None and dtype and not multi_valued:
+        # vectorized path, convert all raw values at once and scatter
+        # them into their rows
+        try:
+            if single_type == 'bool':
+                values = numpy.array(obj_values, dtype=object) == 'True'
+            else:
+                values = numpy.array(obj_values, dtype=object).astype(dtype)
+        except OverflowError:
+            # python ints are unbounded(as are xsd:integer values), a column
+            # with values beyond int64 is left a column of python objects
+            values = None
+    if values is not None:
+        data = numpy.zeros(row_count, dtype=dtype)
+        mask = numpy.ones(row_count, dtype=bool)
+        row_index = numpy.array(rows, dtype='int64')
+        data[row_index] = values
+        mask[row_index] = False
+        return numpy.ma.MaskedArray(data, mask=mask)
+    column = [None] * row_count
+    for row,obj_type,obj_value in zip(rows,obj_types,obj_values):
+        if obj_type is not None:
+            obj_value = convert_value(obj_type,obj_value)
+        if multi_valued:
+            # every row of a multi valued predicate holds a list,
+            # including the rows with a single value
+            if column[row] is None:
+                column[row] = []
+            column[row].append(obj_value)
+        else:
+            column[row] = obj_value
+    if numpy is not None:
+        data = numpy.empty(row_count, dtype=object)
+        # assign cell by cell, so list cells are not broadcast by numpy
+        for row,cell in enumerate(column):
+            data[row] = cell
+        return numpy.ma.MaskedArray(data, mask=numpy.array([cell is None for cell in column], dtype=bool))
+    return column
@@ -0,0 +1,268 @@
+import io
+import re
+from ..sql_manager.models import Triple, TripleWithDatatype
+from ..object_manager.exceptions import RDFImportException
+from lib import insert_triples
+from property_tables import stored_property_tables, iterate_property_triples
+import write_behind
+
+"""
+Streaming import and export of the triple store as N-Triples
+(and export as Turtle). Rows are mapped directly onto the triples
+and triples_with_datatype tables, no RDFSubject objects are involved.
+Exports also include the values stored in property tables.
+Files are read line by line and db rows are fetched in batches, so memory
+stays constant regardless of the size of the dump.
+Language tags are not kept, a "chat"@fr literal is imported as the plain
+string "chat" and exported as an xsd:string literal.
+"""
+
+# IRI prepended to the class relative uris(person/happy_coder@gmail.com)
+# and predicate names(owns) stored in the triple store
+DEFAULT_BASE_URI = "urn:rdf_mapper:"
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+# python datatype name(object_type) -> xsd datatype
+XSD_TYPES = {'str' : 'string', 'unicode' : 'string', 'int' : 'integer', 'long' : 'integer', 'float' : 'double', 'bool' : 'boolean'}
+
+# xsd datatype -> python datatype name(object_type)
+PYTHON_TYPES = {'string' : 'str', 'integer' : 'int', 'int' : 'int', 'long' : 'long', 'short' : 'int', 'double' : 'float', 'float' : 'float', 'decimal' : 'float', 'boolean' : 'bool'}
+
+# characters escaped in N-Triples literals
+ESCAPES = {u'\\' : u'\\\\', u'"' : u'\\"', u'\n' : u'\\n', u'\r' : u'\\r', u'\t' : u'\\t'}
+UNESCAPES = {u'\\' : u'\\', u'"' : u'"', u"'" : u"'", u'n' : u'\n', u'r' : u'\r', u't' : u'\t', u'b' : u'\b', u'f' : u'\f'}
+
+TERM = r'(<[^>]*>|_:\S+)'
+LITERAL = r'"((?:[^"\\]|\\.)*)"(?:\^\^<([^>]*)>|@[a-zA-Z0-9-]+)?'
+NTRIPLE_LINE = re.compile(r'^\s*' + TERM + r'\s+' + TERM + r'\s+(?:' + TERM + r'|' + LITERAL + r')\s*\.\s*$')
+ESCAPE_SEQUENCE = re.compile(r'\\(u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)')
+# scheme of an absolute IRI(http:, urn:, ...), store uris(person/...) have none
+SCHEME = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+def escape_literal(value):
+    """
+    Escapes a literal value for output in N-Triples/Turtle
+    value - the unicode value
+    """
+    return u''.join([ESCAPES.get(char, char) for char in value])
+
+def unescape_literal(value):
+    """
+    Resolves the escape sequences of an N-Triples literal
+    value - the escaped literal, without the surrounding quotes
+    """
+    def replace(match):
+        sequence = match.group(1)
+        if len(sequence) > 1:
+            code_point = int(sequence[1:], 16)
+            try:
+                return unichr(code_point)
+            except ValueError:
+                # narrow python builds cannot represent astral code points with unichr
+                return ('\\U%08x' % code_point).decode('unicode-escape')
+        return UNESCAPES.get(sequence, sequence)
+    return ESCAPE_SEQUENCE.sub(replace, value)
+
+def to_iri(uri, base_uri):
+    """
+    Formats a store uri(or predicate name) as an IRI term.
+    Imported blank nodes are stored as _:node and written back unchanged,
+    imported IRIs outside the base IRI are stored whole and written back
+    without the base.
+    uri - the uri as stored in the triple store
+    base_uri - IRI prepended to the uri
+    """
+    if uri.startswith('_:'):
+        return uri
+    if SCHEME.match(uri):
+        return u"<{0}>".format(uri)
+    return u"<{0}{1}>".format(base_uri, uri)
+
+def from_iri(term, base_uri):
+    """
+    Converts an IRI(or blank node) term back to a store uri
+    term - the term as written in the file(<iri> or _:node)
+    base_uri - IRI stripped from the front of the term
+    """
+    if term.startswith('<'):
+        term = term[1:-1]
+        if term.startswith(base_uri):
+            term = term[len(base_uri):]
+    return term
+
+def to_literal(object_type, object_value, base_uri):
+    """
+    Formats a stored python value as a typed literal term
+    object_type - the python datatype name
+    object_value - the stored string value
+    base_uri - IRI used for datatypes with no xsd equivalent
+    """
+    xsd_type = XSD_TYPES.get(object_type)
+    if xsd_type:
+        datatype = XSD + xsd_type
+    else:
+        datatype = "{0}datatype/{1}".format(base_uri, object_type)
+    if object_type == 'bool':
+        # xsd booleans are lower case
+        object_value = object_value.lower()
+    return u'"{0}"^^<{1}>'.format(escape_literal(object_value), datatype)
+
+def from_literal(value, datatype, base_uri):
+    """
+    Converts a literal back to a (python datatype name, stored value) pair
+    value - the escaped literal value
+    datatype - the datatype IRI of the literal(None for plain literals)
+    base_uri - IRI prefix of datatypes with no xsd equivalent
+    """
+    value = unescape_literal(value)
+    object_type = 'str'
+    if datatype:
+        if datatype.startswith(XSD):
+            object_type = PYTHON_TYPES.get(datatype[len(XSD):], 'str')
+        elif datatype.startswith(base_uri + "datatype/"):
+            object_type = datatype[len(base_uri + "datatype/"):]
+    if object_type == 'bool':
+        # stored the way str(bool) formats them
+        value = str(value in ('true', '1'))
+    elif object_type == 'str':
+        try:
+            value.encode('ascii')
+        except UnicodeError:
+            # str() of the value would fail when it is loaded
+            object_type = 'unicode'
+    return (object_type, value)
+
+def class_filters(query, column, classes):
+    """
+    Restricts a query to the triples of the given classes
+    query - the SQLAlchemy query
+    column - the subject_uri column of the queried model
+    classes - list of class names(or RDFSubject classes)
+    """
+    if classes:
+        criteria = [column.like("{0}/%".format(getattr(cl, '__name__', cl).lower())) for cl in classes]
+        query = query.filter(reduce(lambda a, b: a | b, criteria))
+    return query
+
+def iterate_triples(session, classes=None, batch_size=10000):
+    """
+    Streams the rows of both triple tables and the values of the property
+    tables, ordered by subject within each table, as
+    (subject, predicate, object_uri, object_type, object_value)
+    tuples. object_uri is None for literals, object_type/value are None for
+    uri objects.
+    session - the SQLAlchemy db session
+    classes - list of class names(or RDFSubject classes) to restrict the output to
+    batch_size - the number of rows fetched from the db at a time
+    """
+    write_behind.flush()
+    triples = session.query(Triple.subject_uri,Triple.predicate_uri,Triple.object_uri)
+    triples = class_filters(triples, Triple.subject_uri, classes).order_by(Triple.subject_uri)
+    for sub_uri,pred_uri,obj_uri in triples.yield_per(batch_size):
+        yield (sub_uri,pred_uri,obj_uri,None,None)
+    triples_with_datatype = session.query(TripleWithDatatype.subject_uri,TripleWithDatatype.predicate_uri,TripleWithDatatype.object_type,TripleWithDatatype.object_value)
+    triples_with_datatype = class_filters(triples_with_datatype, TripleWithDatatype.subject_uri, classes).order_by(TripleWithDatatype.subject_uri)
+    for sub_uri,pred_uri,obj_type,obj_value in triples_with_datatype.yield_per(batch_size):
+        yield (sub_uri,pred_uri,None,obj_type,obj_value)
+    cls_names = None
+    if classes:
+        cls_names = [getattr(cl, '__name__', cl).lower() for cl in classes]
+    for cls_name,table in sorted(stored_property_tables(session, cls_names).items()):
+        for sub_uri,pred_uri,obj_type,obj_value in iterate_property_triples(session, table, batch_size):
+            yield (sub_uri,pred_uri,None,obj_type,obj_value)
+    session.commit()
+
+def format_object(obj_uri, obj_type, obj_value, base_uri):
+    """
+    Formats the object of a streamed row as an IRI or literal term
+    """
+    if obj_uri is not None:
+        return to_iri(obj_uri, base_uri)
+    return to_literal(obj_type, obj_value, base_uri)
+
+def export_ntriples(path, session, classes=None, base_uri=DEFAULT_BASE_URI, batch_size=10000):
+    """
+    Writes the triple store(or the triples of the given classes)
+    to an N-Triples file. Returns the number of triples written.
+    path - the file to write
+    session - the SQLAlchemy db session
+    classes - list of class names(or RDFSubject classes) to export, all if None
+    base_uri - IRI prepended to the stored uris and predicate names
+    batch_size - the number of rows fetched from the db at a time
+    """
+    count = 0
+    with io.open(path, 'w', encoding='utf-8') as out:
+        for sub_uri,pred_uri,obj_uri,obj_type,obj_value in iterate_triples(session, classes, batch_size):
+            out.write(u"{0} {1} {2} .\n".format(to_iri(sub_uri, base_uri), to_iri(pred_uri, base_uri), format_object(obj_uri, obj_type, obj_value, base_uri)))
+            count += 1
+    return count
+
+def export_turtle(path, session, classes=None, base_uri=DEFAULT_BASE_URI, batch_size=10000):
+    """
+    Writes the triple store(or the triples of the given classes)
+    to a Turtle file, grouping the predicates of each subject.
+    Returns the number of triples written.
+    path - the file to write
+    session - the SQLAlchemy db session
+    classes - list of class names(or RDFSubject classes) to export, all if None
+    base_uri - IRI prepended to the stored uris and predicate names
+    batch_size - the number of rows fetched from the db at a time
+    """
+    count = 0
+    current_subject = None
+    with io.open(path, 'w', encoding='utf-8') as out:
+        for sub_uri,pred_uri,obj_uri,obj_type,obj_value in iterate_triples(session, classes, batch_size):
+            if sub_uri == current_subject:
+                # same subject as the previous triple, continue its predicate list
+                out.write(u" ;\n    ")
+            else:
+                if current_subject is not None:
+                    out.write(u" .\n")
+                out.write(u"{0} ".format(to_iri(sub_uri, base_uri)))
+                current_subject = sub_uri
+            out.write(u"{0} {1}".format(to_iri(pred_uri, base_uri), format_object(obj_uri, obj_type, obj_value, base_uri)))
+            count += 1
+        if current_subject is not None:
+            out.write(u" .\n")
+    return count
+
+def import_ntriples(path, session, base_uri=DEFAULT_BASE_URI, chunk_size=10000):
+    """
+    Reads an N-Triples file into the triple store. IRI objects become
+    triples, literals become triples with datatype(typed from their xsd datatype,
+    language tags are dropped). Blank nodes are stored as _:node.
+    Triples are inserted in chunks, each chunk in its own transaction.
+    Returns the number of triples imported.
+    path - the file to read
+    session - the SQLAlchemy db session
+    base_uri - IRI stripped from the front of subjects, predicates and objects
+    chunk_size - the number of triples inserted per executemany statement
+    """
+    count = 0
+    triples = []
+    triples_with_datatype = []
+    with io.open(path, 'r', encoding='utf-8') as source:
+        for line_number, line in enumerate(source, 1):
+            stripped = line.strip()
+            # skip blank lines and comments
+            if not stripped or stripped.startswith('#'):
+                continue
+            match = NTRIPLE_LINE.match(stripped)
+            if match is None:
+                raise RDFImportException(1, line_number, line)
+            subject, predicate, obj_term, literal, datatype = match.groups()
+            sub_uri = from_iri(subject, base_uri)
+            pred_uri = from_iri(predicate, base_uri)
+            if obj_term is not None:
+                triples.append((sub_uri, pred_uri, from_iri(obj_term, base_uri)))
+            else:
+                obj_type, obj_value = from_literal(literal, datatype, base_uri)
+                triples_with_datatype.append((sub_uri, pred_uri, obj_type, obj_value))
+            count += 1
+            if len(triples) + len(triples_with_datatype) >= chunk_size:
+                insert_triples(triples, triples_with_datatype, session)
+                triples = []
+                triples_with_datatype = []
+    insert_triples(triples, triples_with_datatype, session)
+    return count
@@ -0,0 +1,214 @@
+from sqlalchemy import Table, Column, String, MetaData, select
+from sqlalchemy.engine.reflection import Inspector
+from ..sql_manager.models import Triple, TripleWithDatatype
+from ..sql_manager.lib import get_table
+from ..sql_manager.instrumentation import instrumented, increment
+from ..sql_manager import search
+from ..sql_manager import terms
+import encoded
+from lib import where_subjects_filter, TYPE_COLUMN_SUFFIX
+import write_behind
+
+"""
+Property table storage for classes declared with
+storage = 'property_table'. The single valued literal predicates of
+such a class are stored in one wide row per object, in a table of the
+class's own({class name}_properties), with a value and a datatype column
+per predicate. List valued and reference predicates stay in the triple
+tables. Finds read the property rows and the remaining triples of the
+matching objects with one query per table, and hand them on as triples
+so the object layer does not need to know where they came from.
+"""
+
+# class name -> property table
+property_tables = {}
+# suffix of the property table names
+TABLE_SUFFIX = '_properties'
+
+def get_property_table(cls_name, pred_names, session):
+    """
+    Returns the property table of a class, creating it in the db the
+    first time it is used. Columns of predicates added to the class
+    after the table was created are added to it.
+    cls_name - the lower case class name
+    pred_names - the predicates stored in the table
+    session - the SQLAlchemy db session
+    """
+    table = property_tables.get(cls_name)
+    if table is None:
+        columns = [Column('subject_uri', String(255), primary_key=True)]
+        for pred_name in pred_names:
+            columns.append(Column(pred_name, String(255)))
+            columns.append(Column(pred_name + TYPE_COLUMN_SUFFIX, String(255)))
+        table = Table(cls_name + TABLE_SUFFIX, MetaData(), *columns)
+        # on the session's connection, a save may already hold a write lock
+        connection = session.connection()
+        if connection.dialect.has_table(connection, table.name):
+            add_missing_columns(table, connection)
+        else:
+            table.create(bind=connection)
+        # committed now, the write behind thread writes rows to it from another connection
+        session.commit()
+        property_tables[cls_name] = table
+    return table
+
+def add_missing_columns(table, connection):
+    """
+    Adds the columns of the table missing from its version in the db
+    table - the property table, as the class defines it
+    connection - the SQLAlchemy connection
+    """
+    existing = set([column['name'] for column in Inspector.from_engine(connection).get_columns(table.name)])
+    preparer = connection.dialect.identifier_preparer
+    for column in table.c:
+        if column.name not in existing:
+            connection.execute("ALTER TABLE {0} ADD COLUMN {1} {2}".format(preparer.format_table(table), preparer.format_column(column), column.type.compile(dialect=connection.dialect)))
+
+def stored_property_tables(session, cls_names=None):
+    """
+    Returns {class name : property table} of the property tables in the db,
+    including those of classes not used by this process yet
+    session - the SQLAlchemy db session
+    cls_names - lower case class names to restrict the result to
+    """
+    connection = session.connection()
+    tables = {}
+    for table_name in Inspector.from_engine(connection).get_table_names():
+        cls_name = table_name[:-len(TABLE_SUFFIX)]
+        if not table_name.endswith(TABLE_SUFFIX) or (cls_names is not None and cls_name not in cls_names):
+            continue
+        table = property_tables.get(cls_name)
+        if table is None:
+            table = Table(table_name, MetaData(), autoload=True, autoload_with=connection)
+        tables[cls_name] = table
+    return tables
+
+def iterate_property_triples(session, table, batch_size=10000):
+    """
+    Streams the values of a property table, ordered by subject, as
+    (subject, predicate, object_type, object_value) tuples
+    session - the SQLAlchemy db session
+    table - the property table
+    batch_size - the number of rows fetched from the db at a time
+    """
+    pred_names = [c.name for c in table.c if c.name != 'subject_uri' and not c.name.endswith(TYPE_COLUMN_SUFFIX)]
+    rows = session.execute(select([table]).order_by(table.c.subject_uri))
+    batch = rows.fetchmany(batch_size)
+    while batch:
+        for row in batch:
+            for pred_name in pred_names:
+                if row[pred_name] is not None:
+                    yield (row['subject_uri'],pred_name,row[pred_name + TYPE_COLUMN_SUFFIX],row[pred_name])
+        batch = rows.fetchmany(batch_size)
+
+def save_properties(table, uri, values, session, failed=None):
+    """
+    Replaces the property row of an object. Does not commit, the
+    row is committed with the object's triples by save_triples.
+    table - the class's property table
+    uri - the classified uri of the object
+    values - dict of predicate name : value(None values are stored as NULL)
+    session - the SQLAlchemy db session
+    failed - with write behind on, called with the exception if the queued write fails
+    """
+    if not write_behind.enqueue(write_properties, (table, uri, values), failed):
+        write_properties(table, uri, values, session)
+
+def write_properties(table, uri, values, session):
+    """
+    Writes the property row of save_properties
+    """
+    row = {'subject_uri' : uri}
+    literals = []
+    for pred_name,value in values.iteritems():
+        if value is not None:
+            row[pred_name] = str(value)
+            row[pred_name + TYPE_COLUMN_SUFFIX] = value.__class__.__name__
+            literals.append((uri,pred_name,value.__class__.__name__,row[pred_name]))
+    session.execute(table.delete().where(table.c.subject_uri == uri))
+    session.execute(table.insert(), row)
+    # values loaded as triples(bulk_load, import_ntriples) are replaced by the row
+    delete_literal_triples(uri, [t[1] for t in literals], session)
+    # the whole row is replaced, so are its values in the full text index
+    search.unindex_predicates(session, uri, values.keys())
+    search.index_literals(session, literals)
+
+def delete_literal_triples(uri, pred_names, session):
+    """
+    Deletes the triples with datatype of some predicates of an object.
+    Does not commit.
+    uri - the classified uri of the object
+    pred_names - the predicate names
+    session - the SQLAlchemy db session
+    """
+    if not pred_names:
+        return
+    if terms.enabled():
+        return encoded.delete_literal_triples(uri, pred_names, session)
+    triples_with_datatype_table = get_table(TripleWithDatatype)
+    session.execute(triples_with_datatype_table.delete().where(triples_with_datatype_table.c.subject_uri == uri).where(triples_with_datatype_table.c.predicate_uri.in_(pred_names)))
+
+def delete_properties(uri, session):
+    """
+    Deletes the property row of an object, if its class has a property table.
+    Does not commit.
+    uri - the classified uri of the object
+    session - the SQLAlchemy db session
+    """
+    table = property_tables.get(uri[0:uri.find('/')])
+    if table is not None:
+        session.execute(table.delete().where(table.c.subject_uri == uri))
+
+@instrumented('find_property_triples')
+def find_property_triples(cls_name, table, session, where_dict=None):
+    """
+    The find_triples of classes stored in a property table. Returns the
+    same tuple of (array of triple objects, array of triple_with_datatype
+    objects), the property rows are turned into triple_with_datatype objects.
+    cls_name - The string class name of the type of object we are searching for
+    table - the class's property table
+    session - the SQLAlchemy session
+    where_dict - dictionary of the object attribute : value used to specifiy the
+    objects we are interested in.
+    """
+    write_behind.flush()
+    cls_name_query_str = "{0}/%".format(cls_name)
+    property_rows = select([table]).where(table.c.subject_uri.like(cls_name_query_str))
+    if terms.enabled():
+        if where_dict:
+            for criterion in encoded.where_subjects_filter(session, table.c.subject_uri, where_dict, table, uri_column=True):
+                property_rows = property_rows.where(criterion)
+        triples,triples_with_datatype = encoded.find_triples(cls_name, session, where_dict, table)
+        return property_triples(session, table, property_rows, triples, triples_with_datatype)
+    triples = session.query(Triple).filter(Triple.subject_uri.like(cls_name_query_str))
+    triples_with_datatype = session.query(TripleWithDatatype).filter(TripleWithDatatype.subject_uri.like(cls_name_query_str))
+    if where_dict:
+        # every source is restricted with the same subject criteria, so
+        # an object is found whichever source its matching predicate is in
+        for criterion in where_subjects_filter(table.c.subject_uri, where_dict, table):
+            property_rows = property_rows.where(criterion)
+        for criterion in where_subjects_filter(Triple.subject_uri, where_dict, table):
+            triples = triples.filter(criterion)
+        for criterion in where_subjects_filter(TripleWithDatatype.subject_uri, where_dict, table):
+            triples_with_datatype = triples_with_datatype.filter(criterion)
+    return property_triples(session, table, property_rows, triples.all(), triples_with_datatype.all())
+
+def property_triples(session, table, property_rows, triples, triples_with_datatype):
+    """
+    Adds the values of the selected property rows to the triples
+    with datatype of find_property_triples and returns its result
+    """
+    pred_names = [c.name for c in table.c if c.name != 'subject_uri' and not c.name.endswith(TYPE_COLUMN_SUFFIX)]
+    for row in session.execute(property_rows):
+        for pred_name in pred_names:
+            if row[pred_name] is not None:
+                # not added to the session, only carries the values
+                triple = TripleWithDatatype()
+                triple.subject_uri = row['subject_uri']
+                triple.predicate_uri = pred_name
+                triple.object_type = row[pred_name + TYPE_COLUMN_SUFFIX]
+                triple.object_value = row[pred_name]
+                triples_with_datatype.append(triple)
+    session.commit()
+    increment('rows', len(triples) + len(triples_with_datatype))
+    return (triples,triples_with_datatype)
@@ -0,0 +1,227 @@
+import atexit
+import threading
+import time
+from ..sql_manager.lib import create_session, set_id_block_size
+from ..sql_manager.instrumentation import instrumented
+from ..object_manager.exceptions import RDFWriteBehindException
+
+"""
+Write behind batching of saves. When enabled, save_triples(and the
+property row writes of save) do not write and commit themselves, they
+enqueue their writes, which a background thread writes with its own
+session and commits in one transaction per batch. A batch is written
+when max_pending writes are queued or the oldest write has waited
+max_delay seconds, whichever comes first. flush() is the durability
+barrier, it returns once every write queued before it is written.
+Reads and deletes flush first, so they always see the saves made
+before them. When a batch fails, its writes are retried one save at a
+time, so only the failing saves are lost, and their errors are raised
+to the threads that queued them, by their next flush(or read, or
+delete). Pending writes are flushed at exit.
+"""
+
+# the active queue, set by enable
+queue = {'active' : None}
+
+class WriteBehindQueue(object):
+    """
+    The buffer of pending writes and the thread flushing it
+    """
+
+    def __init__(self, session, max_pending, max_delay):
+        self.engine = session.bind
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.condition = threading.Condition()
+        # pending writes, (function, args, failed, thread id) the function
+        # is called with the flush session, failed if the write fails
+        self.pending = []
+        # time the oldest pending write was queued
+        self.oldest = None
+        # number of writes queued/ written(or failed) so far
+        self.queued = 0
+        self.written = 0
+        self.flush_requested = False
+        self.stopped = False
+        # thread id -> [(exception, failed callback)] of the failed writes it queued
+        self.errors = {}
+        self.thread = threading.Thread(target=self.run, name='rdf_mapper write behind')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def enqueue(self, function, args, failed=None):
+        """
+        Queues a write
+        function - the write function, called as function(*args, session)
+        args - the arguments of the write
+        failed - called with the exception if the write fails, in the
+        queuing thread before the error is raised to it. The writes
+        queued with the same failed callback(the writes of one save)
+        are retried together.
+        """
+        with self.condition:
+            # errors of earlier writes are raised by flush, never here,
+            # so a write is not dropped in the middle of a save
+            self.pending.append((function, args, failed, threading.current_thread().ident))
+            if self.oldest is None:
+                self.oldest = time.time()
+            self.queued += 1
+            if len(self.pending) >= self.max_pending:
+                self.condition.notify_all()
+
+    def flush(self):
+        """
+        Blocks until every write queued so far is written
+        """
+        with self.condition:
+            target = self.queued
+            while self.written < target:
+                self.flush_requested = True
+                self.condition.notify_all()
+                self.condition.wait()
+            self.raise_error()
+
+    def stop(self):
+        """
+        Flushes the pending writes and stops the flushing thread
+        """
+        try:
+            self.flush()
+        finally:
+            with self.condition:
+                self.stopped = True
+                self.condition.notify_all()
+            self.thread.join()
+
+    def raise_error(self):
+        """
+        Raises the errors of the failed writes queued by the calling
+        thread(once). Called holding the condition.
+        """
+        failures = self.errors.pop(threading.current_thread().ident, None)
+        if failures:
+            for error,failed in failures:
+                if failed is not None:
+                    failed(error)
+            raise RDFWriteBehindException(1, [error for error,failed in failures])
+
+    def run(self):
+        """
+        The flushing thread, writes the pending writes in batches
+        """
+        session = create_session(self.engine)
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    if self.pending and (self.flush_requested or len(self.pending) >= self.max_pending or time.time() - self.oldest >= self.max_delay):
+                        break
+                    if self.pending:
+                        self.condition.wait(max(self.max_delay - (time.time() - self.oldest), 0.001))
+                    else:
+                        self.condition.wait()
+                if self.stopped and not self.pending:
+                    return
+                batch = self.pending
+                self.pending = []
+                self.oldest = None
+                self.flush_requested = False
+            failures = self.write(batch, session)
+            with self.condition:
+                for error,failed,thread_id in failures:
+                    self.errors.setdefault(thread_id, []).append((error, failed))
+                self.written += len(batch)
+                self.condition.notify_all()
+
+    @instrumented('write_behind_flush')
+    def write(self, batch, session):
+        """
+        Writes a batch of writes in one transaction. When it fails, the
+        writes of each save are retried in a transaction of their own, so
+        one bad save does not lose the others, and is not half written.
+        Returns [(exception, failed, thread id)] of the saves that failed.
+        """
+        try:
+            for function,args,failed,thread_id in batch:
+                function(*(args + (session,)))
+            session.commit()
+            return []
+        except Exception:
+            session.rollback()
+        # the writes of a save share its failed callback, saves keep their order
+        saves = []
+        save_writes = {}
+        for write in batch:
+            failed = write[2]
+            if failed is not None and id(failed) in save_writes:
+                save_writes[id(failed)].append(write)
+            else:
+                saves.append([write])
+                if failed is not None:
+                    save_writes[id(failed)] = saves[-1]
+        failures = []
+        for writes in saves:
+            try:
+                for function,args,failed,thread_id in writes:
+                    function(*(args + (session,)))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                failures.append((e, writes[0][2], writes[0][3]))
+        return failures
+
+def enable(session, max_pending=1000, max_delay=0.5, id_block_size=100):
+    """
+    Turns write behind on
+    session - the SQLAlchemy db session(its engine is used by the flushing thread)
+    max_pending - number of queued writes that triggers a flush
+    max_delay - seconds a write can wait before it is flushed
+    id_block_size - auto URIs are reserved(and committed) in blocks of this
+    size, so saves do not hold a write lock the flushing thread would wait on
+    """
+    if queue['active'] is not None:
+        return queue['active']
+    url = session.bind.url
+    if url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:'):
+        # every connection to an in memory sqlite db gets its own db
+        raise RDFWriteBehindException(2)
+    set_id_block_size(id_block_size)
+    queue['active'] = WriteBehindQueue(session, max_pending, max_delay)
+    return queue['active']
+
+def disable():
+    """
+    Flushes the pending writes and turns write behind off
+    """
+    active = queue['active']
+    if active is not None:
+        queue['active'] = None
+        set_id_block_size(1)
+        active.stop()
+
+# the flushing thread is a daemon, the writes still pending
+# at exit are flushed before it is killed
+atexit.register(disable)
+
+def enqueue(function, args, failed=None):
+    """
+    Queues a write when write behind is on. Returns whether it was queued,
+    when it was not the caller writes it itself.
+    function - the write function, called as function(*args, session)
+    args - tuple of the arguments of the write
+    failed - called with the exception if the write fails
+    """
+    active = queue['active']
+    if active is None:
+        return False
+    active.enqueue(function, args, failed)
+    return True
+
+def flush():
+    """
+    Durability barrier, returns once every queued write is written.
+    Raises RDFWriteBehindException for the failed writes queued by
+    the calling thread. Does nothing when write behind is off.
+    """
+    active = queue['active']
+    if active is not None:
+        active.flush()